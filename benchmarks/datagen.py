@@ -0,0 +1,84 @@
+"""
+Synthetic, seeded data generators for the offline benchmark suite.
+Shapes mirror what the client handles in production: wide TA event dumps,
+large query results, LTV retention/ARPU curves and monthly NUU/OUU/RUU series.
+"""
+import csv
+import numpy as np
+import pandas as pd
+
+EVENT_NAMES = ["login", "logout", "item_use", "gacha_draw", "pay", "level_up", "quest_finish", "chat"]
+COUNTRIES = ["JP", "TH", "PH", "US", "TW", "KR", "HK", "SG"]
+CHANNELS = ["appstore", "googleplay", "official", "huawei"]
+
+def event_frame(rows, extra_cols=24, seed=42):
+    """A TA-style event table: id/event/time columns plus many low-cardinality property columns."""
+    rng = np.random.default_rng(seed)
+    data = {
+        "#user_id": rng.integers(100000000, 100000000 + max(rows // 20, 1), size=rows).astype(str),
+        "#event_name": rng.choice(EVENT_NAMES, size=rows),
+        "#event_time": pd.Timestamp("2026-01-01") + pd.to_timedelta(rng.integers(0, 86400 * 30, size=rows), unit="s"),
+        "country": rng.choice(COUNTRIES, size=rows),
+        "channel": rng.choice(CHANNELS, size=rows),
+        "level": rng.integers(1, 200, size=rows),
+        "amount": np.round(rng.gamma(2.0, 15.0, size=rows), 2),
+    }
+    for i in range(extra_cols):
+        if i % 3 == 0:
+            data[f"prop_{i}"] = rng.integers(0, 10000, size=rows)
+        elif i % 3 == 1:
+            data[f"prop_{i}"] = np.round(rng.random(size=rows), 4)
+        else:
+            data[f"prop_{i}"] = rng.choice(["a", "bb", "ccc", "dddd"], size=rows)
+    return pd.DataFrame(data)
+
+def write_event_csv(path, rows, extra_cols=24, seed=42, chunk_rows=100000):
+    """Write a wide event CSV in chunks so the generator itself stays small in memory."""
+    header_written = False
+    with open(path, "w", encoding="utf-8-sig", newline="") as f:
+        for start in range(0, rows, chunk_rows):
+            n = min(chunk_rows, rows - start)
+            df = event_frame(n, extra_cols=extra_cols, seed=seed + start)
+            df.to_csv(f, index=False, header=not header_written)
+            header_written = True
+    return path
+
+def sample_ids(path, count=3):
+    """Pick IDs that actually occur in the file so the scanner does real matching work."""
+    with open(path, "r", encoding="utf-8-sig") as f:
+        reader = csv.reader(f)
+        next(reader)
+        return [row[0] for _, row in zip(range(count), reader)]
+
+def ltv_cohorts(cohorts, days, seed=42):
+    """Per-cohort LTV inputs (num_day, actual_rr, actual_arpu) with a partially observed tail."""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for c in range(cohorts):
+        num_day = np.arange(1, days + 1)
+        a, b = rng.uniform(0.35, 0.55), rng.uniform(-0.6, -0.35)
+        rr = np.where(num_day == 1, 1.0, a * np.maximum(num_day - 1, 1) ** b) * rng.normal(1.0, 0.03, size=days)
+        arpu = rng.uniform(0.5, 3.0) * (num_day ** -0.15) * rng.normal(1.0, 0.1, size=days)
+        observed = rng.integers(days // 3, days)
+        rr[observed:] = np.nan
+        arpu[observed:] = np.nan
+        frames.append(pd.DataFrame({"cohort": c, "num_day": num_day, "actual_rr": rr, "actual_arpu": arpu}))
+    return frames
+
+def mau_series(series, months, seed=42):
+    """Monthly NUU/OUU/RUU history for many game/region series."""
+    rng = np.random.default_rng(seed)
+    frames = []
+    for s in range(series):
+        base = rng.uniform(5000, 200000)
+        dates = pd.date_range("2023-01-01", periods=months, freq="MS")
+        frames.append(pd.DataFrame({
+            "data_date": dates,
+            "nuu": (base * rng.uniform(0.1, 0.3, size=months)).astype(int),
+            "ouu": (base * rng.uniform(0.5, 0.8, size=months)).astype(int),
+            "ruu": (base * rng.uniform(0.05, 0.15, size=months)).astype(int),
+            "nuu_retention_rate": rng.uniform(0.2, 0.4, size=months),
+            "ouu_retention_rate": rng.uniform(0.6, 0.85, size=months),
+            "ruu_retention_rate": rng.uniform(0.3, 0.5, size=months),
+        }))
+    return frames
@@ -0,0 +1,32 @@
+import os
+import sys
+import argparse
+
+# Add project root to sys.path to allow imports from src
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datagen
+from src.config import settings
+from src.utils.logger import logger
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic fixtures for the local engine (--engine local).")
+    parser.add_argument("--rows", type=int, default=1000000, help="Rows in the events fixture")
+    parser.add_argument("--dir", default=settings.LOCAL_ENGINE.fixtures_dir, help="Target fixtures directory")
+    parser.add_argument("--parquet", action="store_true", help="Also write events.parquet (requires pyarrow)")
+    args = parser.parse_args()
+
+    os.makedirs(args.dir, exist_ok=True)
+    csv_path = datagen.write_event_csv(os.path.join(args.dir, "events.csv"), args.rows)
+    logger.info(f"Wrote {args.rows:,} rows to {csv_path}")
+
+    datagen.ltv_cohorts(1, 180)[0].to_csv(os.path.join(args.dir, "ltv_curve.csv"), index=False)
+    datagen.mau_series(1, 36)[0].to_csv(os.path.join(args.dir, "mau_history.csv"), index=False)
+
+    if args.parquet:
+        parquet_path = os.path.join(args.dir, "events_pq.parquet")
+        datagen.event_frame(args.rows).to_parquet(parquet_path, index=False)
+        logger.info(f"Wrote {args.rows:,} rows to {parquet_path}")
+
+if __name__ == "__main__":
+    main()
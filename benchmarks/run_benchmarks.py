@@ -0,0 +1,199 @@
+import os
+import sys
+import gc
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime
+from rich.console import Console
+from rich.table import Table
+
+# Add project root to sys.path to allow imports from src
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import datagen
+from src.config import settings
+from src.utils.analyzer import LogAnalyzer
+from src.utils.exporter import export_data
+from src.utils.metrics import metrics
+from src.core.services.analytics.ltv_service import LTVService
+from src.core.services.analytics.mau_service import MAUService
+from src.core.services.analytics.validator import DataValidator
+
+console = Console()
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+RESULTS_DIR = os.path.join(settings.OUTPUT_DIR, "benchmarks")
+
+def measure(fn, repeats):
+    """
+    Best-of-N wall time measured without tracing, then one extra run under tracemalloc
+    for peak Python/NumPy allocation (tracing slows code down, so it never affects timings).
+    """
+    timings = []
+    for _ in range(repeats):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(timings), peak
+
+class Suite:
+    """Builds all synthetic inputs once in a scratch directory, then exposes one callable per case."""
+    def __init__(self, scale, workdir):
+        self.scale = scale
+        self.workdir = workdir
+        self.cases = {}
+
+    def rows(self, base):
+        return max(int(base * self.scale), 10)
+
+    def build(self):
+        # LogAnalyzer: wide event CSV, substring search for IDs present in the file
+        csv_rows = self.rows(200000)
+        csv_path = datagen.write_event_csv(os.path.join(self.workdir, "events.csv"), csv_rows)
+        target_ids = datagen.sample_ids(csv_path)
+        csv_bytes = os.path.getsize(csv_path)
+        self.cases["analyzer.analyze_csv"] = (lambda: LogAnalyzer.analyze_csv(csv_path, target_ids), csv_rows, csv_bytes)
+
+        # export_data: one large frame per format (xlsx is far slower, so it gets a smaller frame)
+        export_dir = os.path.join(self.workdir, "export")
+        frame = datagen.event_frame(self.rows(200000))
+        xlsx_frame = frame.head(self.rows(20000))
+        for fmt in ["csv", "txt", "json"]:
+            self.cases[f"exporter.{fmt}"] = (self._export(frame, fmt, export_dir), len(frame), None)
+        self.cases["exporter.xlsx"] = (self._export(xlsx_frame, "xlsx", export_dir), len(xlsx_frame), None)
+
+        # LTVService: one very long curve and many typical cohorts
+        long_curve = DataValidator.clean_ltv_data(datagen.ltv_cohorts(1, self.rows(3650))[0])
+        self.cases["ltv.long_curve"] = (lambda: LTVService(long_curve).predict(), len(long_curve), None)
+        cohorts = [DataValidator.clean_ltv_data(df) for df in datagen.ltv_cohorts(self.rows(200), 180)]
+        self.cases["ltv.many_cohorts"] = (lambda: [LTVService(df).predict() for df in cohorts], sum(map(len, cohorts)), None)
+
+        # MAUService: many game/region series forecast independently
+        series = [DataValidator.clean_mau_data(df) for df in datagen.mau_series(self.rows(500), 36)]
+        self.cases["mau.multi_series"] = (lambda: [MAUService(df).predict(months_to_predict=12) for df in series], sum(map(len, series)), None)
+
+    @staticmethod
+    def _export(df, fmt, export_dir):
+        def run():
+            for path in export_data(df, filename_prefix=f"bench_{fmt}", formats=[fmt], output_dir=export_dir):
+                os.remove(path)
+        return run
+
+def compare(results, baseline, threshold):
+    """Return {case: [reasons]} for every case slower or hungrier than baseline * (1 + threshold)."""
+    regressions = {}
+    for name, res in results.items():
+        base = baseline.get("cases", {}).get(name)
+        if not base:
+            continue
+        reasons = []
+        for key, label in [("seconds", "time"), ("peak_mb", "peak memory")]:
+            if base.get(key) and res[key] > base[key] * (1 + threshold):
+                reasons.append(f"{label} {res[key]:.3f} vs {base[key]:.3f} ({(res[key] / base[key] - 1) * 100:+.0f}%)")
+        if reasons:
+            regressions[name] = reasons
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="FiveCross offline benchmarks (no network or credentials needed).")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier for all synthetic data sizes")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per case (best is reported)")
+    parser.add_argument("--only", help="Comma separated case name prefixes, e.g. exporter,ltv")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown before flagging (0.2 = 20%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="Write this run as the new baseline")
+    args = parser.parse_args()
+
+    # Without a baseline there is nothing to regress against; fail before spending time on the suite
+    if not args.save_baseline and not os.path.exists(args.baseline):
+        console.print(f"[bold red]No baseline found at {args.baseline}.[/bold red] Record one on this machine first with:\n"
+                      f"  python benchmarks/run_benchmarks.py --save-baseline"
+                      + (f" --scale {args.scale}" if args.scale != 1.0 else "")
+                      + (f" --baseline {args.baseline}" if args.baseline != DEFAULT_BASELINE else ""))
+        sys.exit(2)
+
+    # Keep per-row progress logging and metrics spans out of the timings
+    logging.getLogger("fivecross").setLevel(logging.WARNING)
+    metrics.enabled = False
+
+    workdir = tempfile.mkdtemp(prefix="fcdc_bench_")
+    try:
+        suite = Suite(args.scale, workdir)
+        with console.status("[bold green]Generating synthetic data..."):
+            suite.build()
+
+        prefixes = [p.strip() for p in args.only.split(",")] if args.only else None
+        results = {}
+        for name, (fn, rows, nbytes) in suite.cases.items():
+            if prefixes and not any(name.startswith(p) for p in prefixes):
+                continue
+            with console.status(f"[bold green]Running {name}..."):
+                seconds, peak = measure(fn, args.repeats)
+            results[name] = {
+                "seconds": round(seconds, 4),
+                "rows": rows,
+                "rows_per_s": round(rows / seconds, 1) if seconds else None,
+                "mb_per_s": round(nbytes / seconds / 1024 ** 2, 2) if nbytes and seconds else None,
+                "peak_mb": round(peak / 1024 ** 2, 2),
+            }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("scale") != args.scale:
+            console.print(f"[yellow]Baseline was recorded at scale {baseline.get('scale')}, this run uses {args.scale}; comparison skipped.[/yellow]")
+            baseline = {}
+    regressions = compare(results, baseline, args.threshold)
+
+    table = Table(title=f"Benchmarks (scale={args.scale}, best of {args.repeats})", header_style="bold magenta")
+    for col in ["Case", "Seconds", "Rows/s", "MB/s", "Peak MB", "Baseline s", "Status"]:
+        table.add_column(col, justify="left" if col in ("Case", "Status") else "right")
+    for name, res in results.items():
+        base = baseline.get("cases", {}).get(name, {})
+        status = "[red]REGRESSION[/red]" if name in regressions else ("[green]ok[/green]" if base else "-")
+        table.add_row(name, f"{res['seconds']:.3f}", f"{res['rows_per_s'] or 0:,.0f}", str(res["mb_per_s"] or "-"),
+                      f"{res['peak_mb']:.1f}", f"{base['seconds']:.3f}" if base else "-", status)
+    console.print(table)
+    for name, reasons in regressions.items():
+        console.print(f"[bold red]{name}[/bold red]: " + "; ".join(reasons))
+
+    report = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "scale": args.scale,
+        "repeats": args.repeats,
+        "cases": results,
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    report_path = os.path.join(RESULTS_DIR, f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=4)
+    console.print(f"Results written to: {report_path}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=4)
+        console.print(f"Baseline saved to: {args.baseline}")
+
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
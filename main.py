@@ -1,7 +1,12 @@
 import sys
 import os
 import argparse
+import asyncio
+import contextlib
+import contextvars
 import json
+import time
+import itertools
 import pandas as pd
 from datetime import datetime
 from rich.console import Console
@@ -9,9 +14,18 @@ from rich.table import Table
 
 # Local imports
 from src.config import settings
-from src.utils.logger import logger
-from src.utils.exporter import export_data
-from src.utils.mailer import send_emails
+from src.core.engines.base_engine import BaseEngine
+from src.utils.logger import logger, setup_queue_logging
+from src.utils.exporter import export_data, export_chunks, is_arrow_table, XLSX_MAX_ROWS, STREAMING_FORMATS
+from src.utils.mailer import send_emails, MailDispatcher
+from src.utils.metrics import metrics
+from src.utils.profiler import profiler
+from src.utils.partition_store import PartitionStore
+from src.utils.compaction import compact_results
+from src.utils.local_db import LocalDB
+from src.utils.file_index import get_index, find_file
+from src.utils.journal import RunJournal, task_fingerprint
+from src.utils.retry import is_transient, backoff_delay
 
 console = Console()
 
@@ -26,6 +40,9 @@ def get_engine(engine_name, region="global"):
     elif engine_name == "holo":
         from src.core.engines.ali_engine import HoloEngine
         return HoloEngine(settings.ALI_CREDENTIALS.get(region, {}).get("holo"))
+    elif engine_name == "local":
+        from src.core.engines.local_engine import LocalEngine
+        return LocalEngine(settings.LOCAL_ENGINE)
     return None
 
 def parse_email_recipients(sql_content: str):
@@ -39,10 +56,14 @@ def parse_email_recipients(sql_content: str):
         return [e for e in emails if '@' in e]
     return []
 
-def display_preview(results, title="Data Preview"):
+def display_preview(results, title="Data Preview", stats=None):
     df = None
+    total_rows = None
     if isinstance(results, pd.DataFrame):
         df = results
+    elif is_arrow_table(results):
+        df = results.slice(0, 10).to_pandas()
+        total_rows = results.num_rows
     elif isinstance(results, list) and results:
         last_item = results[-1]
         if isinstance(last_item, dict):
@@ -52,7 +73,8 @@ def display_preview(results, title="Data Preview"):
                     try:
                         if file_path.endswith('.csv'): df = pd.read_csv(file_path, nrows=10)
                         elif file_path.endswith('.xlsx'): df = pd.read_excel(file_path, nrows=10)
-                    except: pass
+                    except (OSError, ValueError, ImportError) as e:
+                        logger.warning(f"Could not read {file_path} for preview: {e}")
             else:
                 headers = last_item.get("header", []) or last_item.get("headers", [])
                 rows = last_item.get("rows", []) or last_item.get("results", [])
@@ -72,83 +94,724 @@ def display_preview(results, title="Data Preview"):
     
     console.print(table)
     console.print("─" * 50 + "\n")
-    logger.info(f"[*] Stats: [bold]{len(df)}[/bold] rows and [bold]{len(df.columns)}[/bold] columns.")
+    logger.info(stats or f"[*] Stats: [bold]{total_rows if total_rows is not None else len(df)}[/bold] rows and [bold]{len(df.columns)}[/bold] columns.")
     return True
 
-def run_fetch_task(task_config, interactive=False):
-    engine_name = task_config.get("engine", "ta")
-    region = task_config.get("region", "global")
-    sql_text = task_config.get("sql")
+def load_task_sql(task_config):
+    """Resolve a task's SQL text (inline or from file) and any MAILTO recipients in the file header."""
+    sql_content = task_config.get("sql")
     sql_file = task_config.get("file")
+    file_recipients = []
+    if not sql_content and sql_file:
+        p = get_index(settings.TASKS_DIR).resolve(sql_file)
+        if p:
+            with open(p, 'r', encoding='utf-8') as f: 
+                sql_content = f.read()
+            file_recipients = parse_email_recipients(sql_content)
+    return sql_content, file_recipients
+
+def engine_fetch_kwargs(task_config):
+    """Engine-specific fetch options taken from the task config."""
+    engine_name = task_config.get("engine", "ta")
+    kwargs = {}
+    if engine_name == "ta":
+        kwargs["headless"] = not task_config.get("show", False)
+    elif engine_name == "local":
+        kwargs.update({k: task_config[k] for k in ("latency", "repeat", "max_rows") if task_config.get(k) is not None})
+    elif engine_name == "odps" and task_config.get("arrow"):
+        kwargs.update({"arrow": True, "workers": task_config.get("download_workers")})
+    elif engine_name == "holo" and task_config.get("shard"):
+        kwargs["shard"] = task_config["shard"]
+    timeout = float(task_config.get("timeout", settings.TASK_TIMEOUT) or 0)
+    if timeout:
+        kwargs["timeout"] = timeout
+    return kwargs
+
+def task_retry_policy(task_config):
+    """(retries, base backoff seconds) for a task, from the task JSON or the TASK_* defaults."""
+    return int(task_config.get("retries", settings.TASK_RETRIES)), float(task_config.get("retry_backoff", settings.TASK_RETRY_BACKOFF))
+
+def deliver_results(task_config, results, file_recipients=None, interactive=False, dispatcher=None):
+    """Export fetched results in the requested formats and email them. Returns the exported file paths."""
+    engine_name = task_config.get("engine", "ta")
     formats = task_config.get("formats", ["xlsx"])
     task_name = task_config.get("name", f"{engine_name}_export")
     mailto = task_config.get("mailto")
-    show_browser = task_config.get("show", False)
 
+    final_file_paths = []
+    if interactive:
+        display_preview(results)
+        answer = ask_download(task_name, formats)
+        if answer is None: return []
+        task_name, formats = answer
+
+    # Handle TA Direct Download
+    if _is_ta_file_result(results):
+        original_file = results[0].get("file_path")
+        try:
+            results = _load_ta_file(results)
+        except (OSError, ValueError) as e:
+            # Unreadable as CSV: deliver the download as it is
+            logger.warning(f"Could not load TA download {original_file} ({e}); sending it unconverted.")
+            final_file_paths = [original_file]
+    if not final_file_paths:
+        register_result(task_config, results)
+        final_file_paths = export_data(results, filename_prefix=task_name, formats=formats)
+
+    mail_results(task_name, final_file_paths, mailto, file_recipients, dispatcher)
+    return final_file_paths
+
+def ask_download(task_name, formats):
+    """Interactive download prompts. Returns (file prefix, formats), or None when the user declines."""
+    if console.input("\n[?] Download? (y/n, default y): ").lower().strip() == 'n': return None
+
+    custom_name = console.input(f"[?] File prefix (Default: '{task_name}'): ").strip()
+    if custom_name: task_name = custom_name
+
+    console.print("\n[?] Select Format:\n  1. Excel (.xlsx)\n  2. CSV (.csv)\n  3. Text (.txt)\n  4. All formats\n  5. Compressed CSV (.csv.gz)")
+    choice = console.input(">> ").strip()
+    if choice == '1': formats = ['xlsx']
+    elif choice == '2': formats = ['csv']
+    elif choice == '3': formats = ['txt']
+    elif choice == '4': formats = ['xlsx', 'csv', 'txt']
+    elif choice == '5': formats = ['csv.gz']
+    return task_name, formats
+
+def mail_results(task_name, file_paths, mailto=None, file_recipients=None, dispatcher=None):
+    """Email exported files to the task's mailto, or to the MAILTO recipients in the SQL header."""
+    recipient_str = mailto or ",".join(file_recipients or [])
+    if recipient_str and file_paths:
+        recipients = [r.strip() for r in recipient_str.split(",") if "@" in r]
+        send = dispatcher.submit if dispatcher else send_emails
+        send(recipients, f"Data Report: {task_name}", f"Task: {task_name} finished at {datetime.now()}", file_paths)
+
+def register_result(task_config, results):
+    """Keep a copy of the result as a local table when the task has "register" (or LOCAL_DB_REGISTER is on)."""
+    register = task_config.get("register") or settings.LOCAL_DB_REGISTER
+    if not register:
+        return
+    name = register if isinstance(register, str) else task_config.get("name", f"{task_config.get('engine', 'ta')}_export")
     try:
+        LocalDB().register(name, results)
+    except Exception as e:
+        logger.error(f"Failed to register local table {name}: {e}")
+
+def estimate_result(task_config, engine, sql_content):
+    """The engine's size estimate ({"rows", "bytes"}), or None when pre-flight is off, unsupported or failed."""
+    if not task_config.get("preflight", settings.PREFLIGHT_ENABLED):
+        return None
+    try:
+        return engine.estimate(sql_content, **engine_fetch_kwargs(task_config))
+    except Exception as e:
+        logger.warning(f"Pre-flight estimate failed ({e}); running a normal fetch.")
+        return None
+
+def is_large_result(estimate):
+    """Streaming is decided from the estimated result rows only; scanned bytes say nothing about result size."""
+    return (estimate.get("rows") or 0) >= settings.STREAM_MIN_ROWS
+
+def _warn_scan_size(estimate):
+    scanned = estimate.get("scan_bytes") if estimate else None
+    if scanned and scanned >= settings.ODPS_SCAN_WARN_BYTES:
+        logger.warning(f"The query scans {scanned / 2**30:.1f} GB; result size unknown, fetching normally "
+                       f"(set \"stream\": true on the task to stream it).")
+
+def preflight(task_config, engine, sql_content):
+    """
+    Estimate the result size before running the query (Holo EXPLAIN, local count; ODPS only
+    reports scanned bytes, which are logged but never trigger streaming).
+    Returns the estimate if the task should stream (chunked fetch, columnar export), else None.
+    Tasks can force streaming with "stream": true or skip the check with "preflight": false.
+    """
+    if task_config.get("stream"):
+        return {"rows": None, "bytes": None}
+    estimate = estimate_result(task_config, engine, sql_content)
+    _warn_scan_size(estimate)
+    if estimate and is_large_result(estimate):
+        logger.warning(f"Large result expected ({estimate['rows']:,} rows); "
+                       f"streaming in chunks of {settings.STREAM_CHUNK_ROWS:,} rows.")
+        return estimate
+    return None
+
+def streaming_formats(formats, estimated_rows=None):
+    """Formats a streamed result is written in: xlsx/json need the whole frame, so they are replaced by parquet."""
+    kept = [f for f in formats if f.lower().strip() in STREAMING_FORMATS]
+    action = "skipped" if kept else "writing parquet instead"
+    for fmt in formats:
+        if fmt in kept:
+            continue
+        if fmt.lower().strip() == "xlsx" and estimated_rows and estimated_rows > XLSX_MAX_ROWS:
+            logger.warning(f"xlsx holds at most {XLSX_MAX_ROWS:,} rows but about {estimated_rows:,} are expected; {action}.")
+        else:
+            logger.warning(f"{fmt} is not written for streamed results; {action}.")
+    return kept or ["parquet"]
+
+def stream_task(task_config, engine, sql_content, estimate, file_recipients=None, dependents=(), dispatcher=None):
+    """
+    Fetch chunk by chunk straight into the exporter, then mail the files. Tasks sharing the query
+    are exported once in the union of their formats and each gets the files of its own formats.
+    Returns {task name: file paths}.
+    """
+    task_name = _task_name(task_config)
+    group = [task_config, *dependents]
+    task_formats = {_task_name(t): streaming_formats(t.get("formats", ["xlsx"]), estimate.get("rows")) for t in group}
+    formats = list(dict.fromkeys(f.lower().strip() for fmts in task_formats.values() for f in fmts))
+    chunks = engine.fetch_chunks(sql_content, chunksize=settings.STREAM_CHUNK_ROWS, **engine_fetch_kwargs(task_config))
+    paths, rows = export_chunks(chunks, filename_prefix=task_name, formats=formats)
+    logger.info(f"Streamed {rows:,} rows for {task_name}.")
+    delivered = {}
+    for t in group:
+        own = tuple(f".{f.lower().strip()}" for f in task_formats[_task_name(t)])
+        task_paths = [p for p in paths if p.endswith(own)]
+        mail_results(_task_name(t), task_paths, t.get("mailto"), file_recipients, dispatcher)
+        delivered[_task_name(t)] = task_paths
+    return delivered
+
+def preview_first(task_config, engine, sql_content, file_recipients=None):
+    """
+    Interactive fetch that previews the first streamed chunk before pulling the rest. The chunk
+    stream stays paused while the user answers, is resumed only after "Download? y", and is
+    closed (server cursor released) on "n". Returns (results, {task name: file paths}), or None
+    for engines that cannot stream (TA), which keep the fetch-then-preview flow.
+    """
+    if type(engine).fetch_chunks is BaseEngine.fetch_chunks:
+        return None
+    task_name = _task_name(task_config)
+    estimate = estimate_result(task_config, engine, sql_content) or {}
+    chunksize = settings.STREAM_CHUNK_ROWS
+    logger.info(f"[*] Fetching preview: {task_name}...")
+    chunks = engine.fetch_chunks(sql_content, chunksize=chunksize, **engine_fetch_kwargs(task_config))
+    try:
+        with metrics.span("preview", engine=task_config.get("engine", "ta")) as span:
+            first = next(chunks, None)
+            span["rows"] = len(first) if first is not None else 0
+        if first is None or first.empty:
+            logger.warning("No data found for preview.")
+            return None, {}
+
+        rows = estimate.get("rows")
+        # A short first chunk is the whole result, except for shards that stream side by side
+        if len(first) < chunksize and not task_config.get("shard"):
+            total = f"{len(first):,} rows (complete)"
+            rows = len(first)
+        elif rows is not None:
+            total = f"about {rows:,} rows (estimate)"
+        elif estimate.get("scan_bytes"):
+            total = f"unknown row count, the query scans {estimate['scan_bytes'] / 2**30:.2f} GB"
+        else:
+            total = "unknown row count"
+        display_preview(first, stats=f"[*] Preview from the first {len(first):,} rows after {span['wall_s']:.1f}s; "
+                                     f"{len(first.columns)} columns, {total}.")
+        answer = ask_download(task_name, task_config.get("formats", ["xlsx"]))
+        if answer is None:
+            return None, {}
+        task_name, formats = answer
+        task_config = {**task_config, "name": task_name, "formats": formats}
+
+        remaining = itertools.chain([first], chunks)
+        if task_config.get("stream") or is_large_result({**estimate, "rows": rows}):
+            formats = streaming_formats(formats, rows)
+            paths, streamed = export_chunks(remaining, filename_prefix=task_name, formats=formats)
+            logger.info(f"Streamed {streamed:,} rows for {task_name}.")
+            mail_results(task_name, paths, task_config.get("mailto"), file_recipients)
+            return {task_name: paths}, {task_name: paths}
+
+        logger.info(f"[*] Fetching: {task_name}...")
+        results = pd.concat(list(remaining), ignore_index=True)
+        results = compact_task_results(task_config, results)
+        return results, {task_name: deliver_results(task_config, results, file_recipients)}
+    finally:
+        chunks.close()
+
+def _is_ta_file_result(results):
+    return isinstance(results, list) and len(results) > 0 and isinstance(results[0], dict) and results[0].get("type") == "file"
+
+def _load_ta_file(results):
+    """Read a downloaded TA result file into a DataFrame and remove the download."""
+    original_file = results[0].get("file_path")
+    with metrics.span("dataframe", engine="ta") as span:
+        df = pd.read_csv(original_file)
+        span["rows"] = len(df)
+    os.remove(original_file)
+    return df
+
+def _ta_frame(results):
+    """A TA result (downloaded file or intercepted JSON) as a DataFrame; other results are returned as they are."""
+    if _is_ta_file_result(results):
+        return _load_ta_file(results)
+    if isinstance(results, list) and results and isinstance(results[-1], dict):
+        last_item = results[-1]
+        headers = last_item.get("header", []) or last_item.get("headers", [])
+        rows = last_item.get("rows", []) or last_item.get("results", [])
+        return pd.DataFrame(rows, columns=headers or None)
+    return results
+
+def merge_into_store(store, results):
+    """Merge a fetched result into the task's partition store and return the full history."""
+    return store.merge(_ta_frame(results))
+
+def compact_task_results(task_config, results):
+    """
+    Apply the task's "compact" option (true, or {"categorical_threshold": 0.2, "arrow_strings": false};
+    default COMPACT_RESULTS) to a fetched result, so exports work from the smaller frame.
+    """
+    options = task_config.get("compact", settings.COMPACT_RESULTS)
+    if not options:
+        return results
+    if _is_ta_file_result(results):
+        results = _load_ta_file(results)
+    return compact_results(results, **(options if isinstance(options, dict) else {}))
+
+def deliver_fanout(task_config, results, file_recipients=None, dependents=(), dispatcher=None):
+    """
+    Deliver one fetched result to its task and to every task deduplicated onto the same query.
+    Returns {task name: exported file paths}.
+    """
+    if dependents and _is_ta_file_result(results):
+        # deliver_results consumes a downloaded TA file, so load it once for all tasks
+        results = _load_ta_file(results)
+    delivered = {_task_name(task_config): deliver_results(task_config, results, file_recipients, dispatcher=dispatcher)}
+    for dep in dependents:
+        with metrics.task(_task_name(dep)):
+            delivered[_task_name(dep)] = deliver_results(dep, results, file_recipients, dispatcher=dispatcher)
+    return delivered
+
+def _task_name(task_config):
+    return task_config.get("name", f"{task_config.get('engine', 'ta')}_export")
+
+def _journal_start(journal, tasks):
+    if journal is None:
+        return
+    for t in tasks:
+        journal.start(_task_name(t), task_fingerprint(t, load_task_sql(t)[0]))
+
+def _journal_finish(journal, tasks, delivered=None, error=None):
+    if journal is None:
+        return
+    for t in tasks:
+        name = _task_name(t)
+        files = (delivered or {}).get(name)
+        if error is None and files:
+            journal.finish(name, "ok", files=files)
+        elif error is None:
+            # A task that produced nothing must run again on --resume
+            logger.error(f"No output files were written for {name}.")
+            journal.finish(name, "failed", error="no output files were written")
+        else:
+            journal.finish(name, "failed", error=error)
+
+def _query_key(task_config):
+    """Normalized (engine, region, SQL, fetch options) identity of the query a task runs, or None if it must run alone."""
+    if task_config.get("incremental"):
+        # Each incremental task owns its store and watermark
+        return None
+    sql_content, _ = load_task_sql(task_config)
+    if not sql_content:
+        return None
+    sql = " ".join(sql_content.split()).rstrip("; ")
+    options = {k: v for k, v in engine_fetch_kwargs(task_config).items() if k != "headless"}
+    engine_name = task_config.get("engine", "ta")
+    return (engine_name, task_config.get("region", "global"), sql, json.dumps(options, sort_keys=True, default=str))
+
+def group_duplicate_tasks(tasks):
+    """
+    Group tasks that would run the same query (same engine, region, whitespace-normalized SQL and
+    fetch options) so each distinct query runs once. Returns [(task, [dependent tasks])] in the
+    order each query first appears; dependents only differ in how the result is exported or mailed.
+    """
+    groups, by_key = [], {}
+    for t in tasks:
+        key = _query_key(t)
+        if key is not None and key in by_key:
+            by_key[key][1].append(t)
+            logger.info(f"[=] {t.get('name', 'Unknown')} reuses the query of {by_key[key][0].get('name', 'Unknown')}")
+            continue
+        group = (t, [])
+        groups.append(group)
+        if key is not None:
+            by_key[key] = group
+    return groups
+
+def run_fetch_task(task_config, interactive=False, dispatcher=None, dependents=(), engines=None, journal=None, first_attempt=0):
+    """
+    Fetch and deliver one task (plus any deduplicated dependents), retrying transient errors with
+    exponential backoff. `first_attempt` counts attempts already made elsewhere (a batch mode that
+    failed over to this path), so a task is never tried more than retries + 1 times in total.
+    Returns the fetched results ({task name: file paths} for a streamed result), or None when the
+    task failed.
+    """
+    engine_name = task_config.get("engine", "ta")
+    task_name = _task_name(task_config)
+    tasks = [task_config, *dependents]
+    retries, backoff = (0, 0) if interactive else task_retry_policy(task_config)
+
+    with profiler.profile(task_name):
+        for attempt in range(first_attempt, retries + 1):
+            _journal_start(journal, tasks)
+            try:
+                with metrics.task(task_name), metrics.span("task", engine=engine_name, attempt=attempt + 1):
+                    results, delivered = _run_fetch_task(task_config, interactive, dispatcher, dependents, engines)
+            except Exception as e:
+                if attempt < retries and is_transient(e):
+                    delay = backoff_delay(attempt, backoff)
+                    logger.warning(f"Fetch error ({task_name}, attempt {attempt + 1}/{retries + 1}): {e}. Retrying in {delay:.0f}s...")
+                    time.sleep(delay)
+                    continue
+                logger.error(f"Fetch error ({task_name}): {e}")
+                _journal_finish(journal, tasks, error=str(e))
+                return None
+            _journal_finish(journal, tasks, delivered)
+            return results
+
+def _run_fetch_task(task_config, interactive=False, dispatcher=None, dependents=(), engines=None):
+    """One attempt at a task. Returns (results, {task name: file paths}); errors propagate to the caller."""
+    engine_name = task_config.get("engine", "ta")
+    region = task_config.get("region", "global")
+    task_name = _task_name(task_config)
+
+    # A long-running caller passes its engines so connections stay open between runs
+    engine = engines.get((engine_name, region)) if engines is not None else None
+    if engine is None:
         engine = get_engine(engine_name, region)
-        sql_content = sql_text
-        file_recipients = []
-        if not sql_content and sql_file:
-            p = os.path.join(settings.TASKS_DIR, sql_file)
-            if not os.path.exists(p):
-                for root, _, files in os.walk(settings.TASKS_DIR):
-                    if sql_file in files:
-                        p = os.path.join(root, sql_file)
-                        break
-            
-            if os.path.exists(p):
-                with open(p, 'r', encoding='utf-8') as f: 
-                    sql_content = f.read()
-                file_recipients = parse_email_recipients(sql_content)
-        
-        if not sql_content:
-            logger.error(f"SQL content not found.")
-            return
+    sql_content, file_recipients = load_task_sql(task_config)
+    if not sql_content:
+        raise FileNotFoundError(f"SQL content not found for task: {task_name}")
+
+    store = PartitionStore.from_task(task_config)
+    if store:
+        sql_content = store.render(sql_content)
+
+    # Interactive runs preview the first chunk and pull the rest only after confirmation
+    if interactive and not store:
+        previewed = preview_first(task_config, engine, sql_content, file_recipients)
+        if previewed is not None:
+            return previewed
 
+    # Incremental stores merge whole frames, so they never stream
+    estimate = preflight(task_config, engine, sql_content) if sql_content and not store else None
+    if estimate is not None:
+        logger.info(f"[*] Streaming: {task_name}...")
+        delivered = stream_task(task_config, engine, sql_content, estimate, file_recipients, dependents, dispatcher)
+        return delivered, delivered
+
+    results = None
+    if sql_content:
         logger.info(f"[*] Fetching: {task_name}...")
-        if engine_name == "ta":
-            results = engine.fetch(sql_content, headless=not show_browser)
+        results = engine.fetch(sql_content, **engine_fetch_kwargs(task_config))
+    if store:
+        results = merge_into_store(store, results)
+    if results is not None:
+        results = compact_task_results(task_config, results)
+
+    delivered = {}
+    if results is not None:
+        if dependents:
+            delivered = deliver_fanout(task_config, results, file_recipients, dependents, dispatcher=dispatcher)
         else:
-            results = engine.fetch(sql_content)
-
-        if results is not None:
-            final_file_paths = []
-            if interactive:
-                display_preview(results)
-                if console.input("\n[?] Download? (y/n, default y): ").lower().strip() == 'n': return
-                
-                custom_name = console.input(f"[?] File prefix (Default: '{task_name}'): ").strip()
-                if custom_name: task_name = custom_name
-
-                console.print("\n[?] Select Format:\n  1. Excel (.xlsx)\n  2. CSV (.csv)\n  3. Text (.txt)\n  4. All formats")
-                choice = console.input(">> ").strip()
-                if choice == '1': formats = ['xlsx']
-                elif choice == '2': formats = ['csv']
-                elif choice == '3': formats = ['txt']
-                elif choice == '4': formats = ['xlsx', 'csv', 'txt']
-
-            # Handle TA Direct Download
-            if isinstance(results, list) and len(results) > 0 and isinstance(results[0], dict) and results[0].get("type") == "file":
-                original_file = results[0].get("file_path")
-                try:
-                    df_tmp = pd.read_csv(original_file)
-                    final_file_paths = export_data(df_tmp, filename_prefix=task_name, formats=formats)
-                    os.remove(original_file)
-                except:
-                    final_file_paths = [original_file]
-            else:
-                final_file_paths = export_data(results, filename_prefix=task_name, formats=formats)
-
-            # Email logic
-            recipient_str = mailto or ",".join(file_recipients)
-            if recipient_str and final_file_paths:
-                recipients = [r.strip() for r in recipient_str.split(",") if "@" in r]
-                send_emails(recipients, f"Data Report: {task_name}", f"Task: {task_name} finished at {datetime.now()}", final_file_paths)
-                
+            delivered = {task_name: deliver_results(task_config, results, file_recipients, interactive=interactive, dispatcher=dispatcher)}
+    return results, delivered
+
+async def _run_fetch_task_async(task_config, engines, limits, dispatcher, dependents=(), journal=None):
+    engine_name = task_config.get("engine", "ta")
+    task_name = _task_name(task_config)
+    tasks = [task_config, *dependents]
+    retries, backoff = task_retry_policy(task_config)
+
+    for attempt in range(retries + 1):
+        _journal_start(journal, tasks)
+        # Each asyncio task runs in its own context copy, so the metrics task name stays per-task
+        try:
+            with metrics.task(task_name), metrics.span("task", engine=engine_name, attempt=attempt + 1):
+                results, delivered = await _fetch_and_deliver_async(task_config, engines, limits, dispatcher, dependents)
+        except Exception as e:
+            if attempt < retries and is_transient(e):
+                delay = backoff_delay(attempt, backoff)
+                logger.warning(f"Fetch error ({task_name}, attempt {attempt + 1}/{retries + 1}): {e}. Retrying in {delay:.0f}s...")
+                await asyncio.sleep(delay)
+                continue
+            logger.error(f"Fetch error ({task_name}): {e}")
+            _journal_finish(journal, tasks, error=str(e))
+            return None
+        _journal_finish(journal, tasks, delivered)
         return results
+
+async def _fetch_and_deliver_async(task_config, engines, limits, dispatcher, dependents=()):
+    engine_name = task_config.get("engine", "ta")
+    region = task_config.get("region", "global")
+    task_name = _task_name(task_config)
+
+    key = (engine_name, region)
+    if key not in engines:
+        engines[key] = get_engine(engine_name, region)
+    engine = engines[key]
+    sql_content, file_recipients = load_task_sql(task_config)
+    if not sql_content:
+        raise FileNotFoundError(f"SQL content not found for task: {task_name}")
+
+    store = PartitionStore.from_task(task_config)
+    if store:
+        sql_content = store.render(sql_content)
+
+    results = None
+    if sql_content:
+        # Take the engine-specific slot first so queued TA tasks do not hold global slots
+        async with limits.get(engine_name) or contextlib.nullcontext(), limits["all"]:
+            logger.info(f"[*] Fetching: {task_name}...")
+            results = await engine.afetch(sql_content, **engine_fetch_kwargs(task_config))
+
+    # Store merges and exports are CPU/disk bound pandas work: keep them off the event loop
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    if store:
+        results = await loop.run_in_executor(None, ctx.run, merge_into_store, store, results)
+    delivered = {}
+    if results is not None:
+        results = await loop.run_in_executor(None, ctx.run, compact_task_results, task_config, results)
+        delivered = await loop.run_in_executor(None, ctx.run, deliver_fanout, task_config, results, file_recipients, dependents, dispatcher)
+    return results, delivered
+
+async def run_batch_async(groups, concurrency=8, dispatcher=None, journal=None, ta_tabs=1):
+    """
+    Run a batch concurrently on one event loop. Holo queries use the native async driver;
+    other engines run their blocking fetch in the default executor. TA runs one query at a
+    time because all TA tasks share one persistent browser profile, unless ta_tabs > 1: then
+    the TA tasks run together in tabs of that browser, in a worker thread beside the rest.
+    That thread also runs the TA tasks that cannot use tabs (incremental), after the tabs, so
+    two browsers never open the same profile at once.
+    """
+    engines = {}
+    limits = {"all": asyncio.Semaphore(concurrency), "ta": asyncio.Semaphore(1)}
+    ta_groups, groups = split_ta_tab_groups(groups, ta_tabs)
+    ta_rest = [g for g in groups if g[0].get("engine", "ta") == "ta"] if ta_groups else []
+    groups = [g for g in groups if all(g is not r for r in ta_rest)]
+    jobs = [_run_fetch_task_async(t, engines, limits, dispatcher, deps, journal) for t, deps in groups]
+    if ta_groups:
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        jobs.append(loop.run_in_executor(None, ctx.run, _run_ta_thread, ta_groups, ta_rest, ta_tabs, dispatcher, journal))
+    try:
+        await asyncio.gather(*jobs)
+    finally:
+        for engine in engines.values():
+            if engine is not None:
+                await engine.aclose()
+
+def _run_ta_thread(ta_groups, ta_rest, tabs, dispatcher=None, journal=None):
+    """All TA work of an --async batch on one thread: the tab groups, then the other TA tasks one by one."""
+    run_ta_tabs(ta_groups, tabs, dispatcher=dispatcher, journal=journal)
+    for t, deps in ta_rest:
+        run_fetch_task(t, dispatcher=dispatcher, dependents=deps, journal=journal)
+
+def _retry_failed(task_config, dependents, dispatcher, journal, error):
+    """
+    A task run outside run_fetch_task failed on its first attempt: retry transient errors through
+    the regular blocking path with the remaining attempts, else record it.
+    """
+    retries, backoff = task_retry_policy(task_config)
+    if retries and is_transient(error):
+        delay = backoff_delay(0, backoff)
+        logger.warning(f"Fetch error ({_task_name(task_config)}, attempt 1/{retries + 1}): {error}. "
+                       f"Retrying with a blocking fetch in {delay:.0f}s...")
+        time.sleep(delay)
+        run_fetch_task(task_config, dispatcher=dispatcher, dependents=dependents, journal=journal, first_attempt=1)
+    else:
+        logger.error(f"Fetch error ({_task_name(task_config)}): {error}")
+        _journal_finish(journal, [task_config, *dependents], error=str(error))
+
+def _submit_odps_task(task_config, engines, dispatcher, dependents=(), journal=None):
+    """Submit one ODPS task without waiting. Returns (instance, file_recipients, store) or None."""
+    region = task_config.get("region", "global")
+    task_name = _task_name(task_config)
+    tasks = [task_config, *dependents]
+    _journal_start(journal, tasks)
+    with metrics.task(task_name):
+        try:
+            if region not in engines:
+                engines[region] = get_engine("odps", region)
+            sql_content, file_recipients = load_task_sql(task_config)
+            if not sql_content:
+                raise FileNotFoundError(f"SQL content not found for task: {task_name}")
+            store = PartitionStore.from_task(task_config)
+            if store:
+                sql_content = store.render(sql_content)
+                if not sql_content:
+                    # Nothing new to fetch: deliver straight from the local store
+                    delivered = deliver_fanout(task_config, compact_task_results(task_config, store.merge(None)), file_recipients, dependents, dispatcher=dispatcher)
+                    _journal_finish(journal, tasks, delivered)
+                    return None
+            logger.info(f"[*] Submitting: {task_name}...")
+            return engines[region].submit(sql_content), file_recipients, store
+        except Exception as e:
+            _retry_failed(task_config, dependents, dispatcher, journal, e)
+            return None
+
+def _collect_finished_odps(pending, engines, dispatcher, fanout, journal=None):
+    """One status poll: download, export and mail every submitted ODPS task whose instance has terminated."""
+    from src.core.engines.ali_engine import ODPSEngine
+    instances = {key: entry[1] for key, entry in pending.items()}
+    done = ODPSEngine.finished(instances)
+    now = time.perf_counter()
+    timed_out = [key for key, (t, _, _, _, submitted_at) in pending.items()
+                 if key not in done and engine_fetch_kwargs(t).get("timeout") and now - submitted_at > engine_fetch_kwargs(t)["timeout"]]
+    for key in done + timed_out:
+        task_config, instance, file_recipients, store, submitted_at = pending.pop(key)
+        task_name = _task_name(task_config)
+        dependents = fanout.get(key, ())
+        try:
+            with metrics.task(task_name), metrics.span("task", engine="odps"):
+                fetch_kwargs = engine_fetch_kwargs(task_config)
+                engine = engines[task_config.get("region", "global")]
+                if key in timed_out:
+                    engine.stop_timed_out(instance, fetch_kwargs["timeout"])
+                metrics.record("execute", time.perf_counter() - submitted_at, engine="odps")
+                # Raises with the instance's error message if it failed
+                instance.wait_for_success()
+                results = engine.collect(instance, arrow=fetch_kwargs.get("arrow", False), workers=fetch_kwargs.get("workers"))
+                if store:
+                    results = store.merge(results)
+                delivered = {}
+                if results is not None:
+                    results = compact_task_results(task_config, results)
+                    delivered = deliver_fanout(task_config, results, file_recipients, dependents, dispatcher=dispatcher)
+            _journal_finish(journal, [task_config, *dependents], delivered)
+        except Exception as e:
+            _retry_failed(task_config, dependents, dispatcher, journal, e)
+
+def run_batch_odps_overlap(groups, dispatcher=None, poll_interval=None, journal=None, ta_tabs=1):
+    """
+    Submit every ODPS task up front so the jobs execute server-side in parallel, then run the
+    other tasks sequentially while a lightweight status poll collects each ODPS result as soon
+    as its instance finishes. Batch latency becomes the slowest ODPS job instead of their sum.
+    With ta_tabs > 1 the TA tasks run together in browser tabs before the remaining tasks.
+    """
+    poll_interval = settings.ODPS_POLL_INTERVAL if poll_interval is None else poll_interval
+    engines, pending = {}, {}
+    fanout = {idx: deps for idx, (_, deps) in enumerate(groups)}
+    for idx, (t, deps) in enumerate(groups):
+        if t.get("engine", "ta") != "odps":
+            continue
+        submitted = _submit_odps_task(t, engines, dispatcher, deps, journal)
+        if submitted:
+            pending[idx] = (t, *submitted, time.perf_counter())
+    if pending:
+        logger.info(f"Submitted {len(pending)} ODPS instances; collecting results as they finish")
+
+    ta_groups, other_groups = split_ta_tab_groups(groups, ta_tabs)
+    if ta_groups:
+        run_ta_tabs(ta_groups, ta_tabs, dispatcher=dispatcher, journal=journal)
+        _collect_finished_odps(pending, engines, dispatcher, fanout, journal)
+    for t, deps in other_groups:
+        if t.get("engine", "ta") == "odps":
+            continue
+        run_fetch_task(t, dispatcher=dispatcher, dependents=deps, journal=journal)
+        _collect_finished_odps(pending, engines, dispatcher, fanout, journal)
+
+    while pending:
+        _collect_finished_odps(pending, engines, dispatcher, fanout, journal)
+        if pending:
+            time.sleep(poll_interval)
+
+def split_ta_tab_groups(groups, tabs):
+    """Split off the TA queries that can share one browser in tabs: ([(task, deps)] for tabs, the rest)."""
+    if tabs <= 1:
+        return [], list(groups)
+    # Incremental tasks keep their own store window, so they still run one at a time
+    ta_groups = [g for g in groups if g[0].get("engine", "ta") == "ta" and not g[0].get("incremental")]
+    if len(ta_groups) < 2:
+        return [], list(groups)
+    return ta_groups, [g for g in groups if all(g is not tg for tg in ta_groups)]
+
+def run_ta_tabs(groups, tabs, dispatcher=None, journal=None):
+    """
+    Run TA queries side by side: one browser per region with each query in its own IDE tab (at
+    most `tabs` at once), so the TA server executes them in parallel instead of one after another.
+    Each result is exported and mailed as usual; failed queries go through the regular retry path.
+    """
+    by_region = {}
+    for t, deps in groups:
+        by_region.setdefault(t.get("region", "global"), []).append((t, deps))
+
+    for region, region_groups in by_region.items():
+        prepared = []
+        for t, deps in region_groups:
+            _journal_start(journal, [t, *deps])
+            sql_content, file_recipients = load_task_sql(t)
+            if not sql_content:
+                _retry_failed(t, deps, dispatcher, journal, FileNotFoundError(f"SQL content not found for task: {_task_name(t)}"))
+                continue
+            prepared.append((t, deps, sql_content, file_recipients))
+        if not prepared:
+            continue
+
+        timeouts = [engine_fetch_kwargs(t).get("timeout") for t, _, _, _ in prepared]
+        logger.info(f"[*] Fetching {len(prepared)} TA tasks in up to {min(tabs, len(prepared))} tabs ({region})...")
+        try:
+            outcomes = get_engine("ta", region).fetch_many(
+                [sql for _, _, sql, _ in prepared],
+                tabs=tabs,
+                show_window=any(t.get("show", False) for t, _, _, _ in prepared),
+                timeout=max(timeouts) if all(timeouts) else None,
+            )
+        except Exception as e:
+            outcomes = [e] * len(prepared)
+
+        for (t, deps, _, file_recipients), outcome in zip(prepared, outcomes):
+            try:
+                if isinstance(outcome, Exception):
+                    raise outcome
+                with metrics.task(_task_name(t)):
+                    results = compact_task_results(t, outcome)
+                    delivered = deliver_fanout(t, results, file_recipients, deps, dispatcher=dispatcher)
+                _journal_finish(journal, [t, *deps], delivered)
+            except Exception as e:
+                _retry_failed(t, deps, dispatcher, journal, e)
+
+def run_serve(args):
+    """Run scheduled tasks from tasks/configs in one long-lived process with warm engines."""
+    from src.core.services.daemon import TaskDaemon
+    dispatcher = MailDispatcher()
+
+    def runner(task, dependents, engines):
+        try:
+            return run_fetch_task(task, dispatcher=dispatcher, dependents=dependents, engines=engines) is not None
+        finally:
+            metrics.write_prometheus()
+
+    daemon = TaskDaemon(runner, get_engine, group_duplicate_tasks, status_port=args.status_port)
+    try:
+        daemon.serve_forever()
+    finally:
+        dispatcher.close()
+
+def run_local_query(args):
+    """Run SQL against registered results and partition stores, then preview and optionally export it."""
+    db = LocalDB()
+    if args.list:
+        tables = db.tables()
+        if not tables:
+            logger.warning("No local tables yet. Fetch with --register (or task \"register\": true) to add some.")
+        for table, path in tables.items():
+            console.print(f"  [bold]{table}[/bold]  {path}")
+        return
+
+    sql_content = args.sql
+    if not sql_content and args.file:
+        sql_content, _ = load_task_sql({"file": args.file})
+    if not sql_content:
+        logger.error("Provide SQL as an argument or with --file.")
+        return
+
+    try:
+        df = db.query(sql_content)
     except Exception as e:
-        logger.error(f"Fetch error: {e}")
+        logger.error(f"Local query error: {e}")
+        return
+    display_preview(df, title="Local Query")
+    if args.formats:
+        paths = export_data(df, filename_prefix=args.name, formats=[f.strip() for f in args.formats.split(",")])
+        if args.mailto and paths:
+            send_emails([r.strip() for r in args.mailto.split(",") if "@" in r], f"Data Report: {args.name}",
+                        f"Task: {args.name} finished at {datetime.now()}", paths)
 
 def run_predict_task(args):
     # (Remains similar to previous ltv logic)
@@ -157,52 +820,72 @@ def run_predict_task(args):
     ecpnu = args.ecpnu
     net_rate = args.net_rate
     
-    search_paths = [file, os.path.join(settings.INPUT_DIR, file), os.path.join(settings.PREDICT_INPUT_DIR, file), os.path.join(settings.EXPORT_DIR, file)]
-    input_path = next((p for p in search_paths if os.path.exists(p)), None)
+    input_path = find_file(file, [settings.INPUT_DIR, settings.PREDICT_INPUT_DIR, settings.EXPORT_DIR], recursive=False)
             
     if not input_path:
         logger.error(f"Input file not found: {file}")
         return
 
     try:
-        from src.core.services.analytics.validator import DataValidator
-        logger.info(f"[*] Predicting {model_type.upper()}...")
-        df_input = pd.read_csv(input_path) if input_path.endswith('.csv') else pd.read_excel(input_path)
+        with profiler.profile(f"predict_{model_type}"):
+            from src.core.services.analytics.validator import DataValidator
+            logger.info(f"[*] Predicting {model_type.upper()}...")
+            df_input = pd.read_csv(input_path) if input_path.endswith('.csv') else pd.read_excel(input_path)
         
-        if model_type == "ltv":
-            from src.core.services.analytics.ltv_service import LTVService
-            df_clean = DataValidator.clean_ltv_data(df_input)
-            service = LTVService(df_clean)
-            result_df = service.predict(ecpnu=ecpnu, net_rate=net_rate)
-            benchmarks = service.get_summary_benchmarks()
-            display_preview(benchmarks, title="LTV Benchmarks")
-            export_name = f"LTV_Report_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            export_data(result_df, filename_prefix=export_name, formats=["xlsx"], output_dir=settings.OUTPUT_DIR)
+            if model_type == "ltv":
+                from src.core.services.analytics.ltv_service import LTVService
+                df_clean = DataValidator.clean_ltv_data(df_input)
+                service = LTVService(df_clean)
+                result_df = service.predict(ecpnu=ecpnu, net_rate=net_rate)
+                benchmarks = service.get_summary_benchmarks()
+                display_preview(benchmarks, title="LTV Benchmarks")
+                export_name = f"LTV_Report_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+                export_data(result_df, filename_prefix=export_name, formats=["xlsx"], output_dir=settings.OUTPUT_DIR)
         
-        elif model_type == "mau":
-            from src.core.services.analytics.mau_service import MAUService
-            df_clean = DataValidator.clean_mau_data(df_input)
-            service = MAUService(df_clean)
-            result_df = service.predict(months_to_predict=args.months, growth_factor=args.growth)
-            display_preview(result_df.tail(15), title="MAU Forecast")
-            export_name = f"MAU_Report_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-            export_data(result_df, filename_prefix=export_name, formats=["xlsx"], output_dir=settings.OUTPUT_DIR)
+            elif model_type == "mau":
+                from src.core.services.analytics.mau_service import MAUService
+                df_clean = DataValidator.clean_mau_data(df_input)
+                service = MAUService(df_clean)
+                result_df = service.predict(months_to_predict=args.months, growth_factor=args.growth)
+                display_preview(result_df.tail(15), title="MAU Forecast")
+                export_name = f"MAU_Report_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+                export_data(result_df, filename_prefix=export_name, formats=["xlsx"], output_dir=settings.OUTPUT_DIR)
 
     except Exception as e:
         logger.error(f"Prediction error: {e}")
 
+def configure_logging(args):
+    """Batch and daemon runs log through the queue (JSON lines + console); interactive runs keep synchronous Rich."""
+    if args.command == "serve":
+        name = "serve"
+    elif args.command == "fetch" and args.task:
+        name = os.path.splitext(os.path.basename(args.task))[0]
+    else:
+        name = None
+    if settings.LOG_MODE == "queue" or (settings.LOG_MODE == "auto" and name):
+        setup_queue_logging(name or args.command or "run", console=settings.LOG_CONSOLE)
+
 def main():
     parser = argparse.ArgumentParser(description="FiveCross Unified Data Client")
     subparsers = parser.add_subparsers(dest="command", help="Available commands")
 
     fetch_parser = subparsers.add_parser("fetch", help="Fetch data from engines")
-    fetch_parser.add_argument("--engine", choices=["ta", "odps", "holo"])
+    fetch_parser.add_argument("--engine", choices=["ta", "odps", "holo", "local"])
     fetch_parser.add_argument("--region", default="global")
     fetch_parser.add_argument("--file", help="SQL file name")
     fetch_parser.add_argument("--task", help="JSON task file")
     fetch_parser.add_argument("--interactive", action="store_true", default=False)
     fetch_parser.add_argument("--show", action="store_true", default=False, help="Show browser (TA only)")
     fetch_parser.add_argument("--mailto", help="Comma separated emails")
+    fetch_parser.add_argument("--async", dest="async_mode", action="store_true", default=False, help="Batch only: run tasks concurrently on an asyncio event loop")
+    fetch_parser.add_argument("--concurrency", type=int, default=8, help="Batch only: max concurrent queries with --async")
+    fetch_parser.add_argument("--odps-overlap", action="store_true", default=False, help="Batch only: submit all ODPS tasks up front and collect each result as soon as it finishes")
+    fetch_parser.add_argument("--ta-tabs", type=int, nargs="?", const=settings.TA_MAX_TABS, default=1, metavar="N", help="Batch only: run TA tasks side by side in up to N IDE tabs of one browser (default N: TA_MAX_TABS)")
+    fetch_parser.add_argument("--resume", action="store_true", default=False, help="Batch only: rerun only tasks that failed, changed or never ran in the last run of this config")
+    fetch_parser.add_argument("--register", nargs="?", const=True, default=None, metavar="TABLE", help="Keep the result as a local table for local-query (default name: task name). "
+                              "With --task it applies to every task, each under its own name, so TABLE is not allowed")
+    fetch_parser.add_argument("--coalesce-mail", action="store_true", default=False, help="Batch only: merge reports for the same recipients into one email")
+    fetch_parser.add_argument("--profile", action="store_true", default=False, help="Profile each task (cProfile, stack samples, tracemalloc) into data/output/profiles")
 
     predict_parser = subparsers.add_parser("predict", help="Run analytics models")
     predict_parser.add_argument("model", choices=["ltv", "mau"])
@@ -211,40 +894,89 @@ def main():
     predict_parser.add_argument("--net_rate", type=float, default=0.35)
     predict_parser.add_argument("--months", type=int, default=12, help="For MAU: Months to forecast")
     predict_parser.add_argument("--growth", type=float, default=1.0, help="For MAU: Growth factor for NUU")
+    predict_parser.add_argument("--profile", action="store_true", default=False, help="Profile the prediction (cProfile, stack samples, tracemalloc) into data/output/profiles")
+
+    local_parser = subparsers.add_parser("local-query", help="Run SQL against locally registered results (DuckDB)")
+    local_parser.add_argument("sql", nargs="?", help="SQL to run, e.g. \"SELECT country, SUM(revenue) FROM daily_kpi GROUP BY 1\"")
+    local_parser.add_argument("--file", help="SQL file name (resolved like task files)")
+    local_parser.add_argument("--list", action="store_true", default=False, help="List the local tables")
+    local_parser.add_argument("--formats", help="Comma separated export formats, e.g. xlsx,csv (default: preview only)")
+    local_parser.add_argument("--name", default="local_query", help="Prefix for exported files")
+    local_parser.add_argument("--mailto", help="Comma separated emails (with --formats)")
+
+    serve_parser = subparsers.add_parser("serve", help="Run scheduled tasks from tasks/configs as a long-running daemon")
+    serve_parser.add_argument("--status-port", type=int, default=None, help="Serve status JSON on 127.0.0.1:<port> (default DAEMON_STATUS_PORT, 0 = off)")
 
     parser.add_argument("--login", action="store_true")
     parser.add_argument("--region", default="global", help="Region for --login (global or china)")
 
     args = parser.parse_args()
+    if getattr(args, "task", None) and isinstance(args.register, str):
+        parser.error("--register TABLE names one table; with --task use plain --register or set \"register\" per task")
 
     if args.login:
         get_engine("ta", getattr(args, 'region', 'global')).login(headless=False)
         return
+    profiler.enabled = getattr(args, 'profile', False)
+    configure_logging(args)
 
     if args.command == "fetch":
         if args.task:
-            task_path = os.path.join(settings.CONFIGS_DIR, args.task)
-            if not os.path.exists(task_path):
-                for root, _, files in os.walk(settings.CONFIGS_DIR):
-                    if args.task in files:
-                        task_path = os.path.join(root, args.task)
-                        break
-            if os.path.exists(task_path):
+            task_path = get_index(settings.CONFIGS_DIR).resolve(args.task)
+            if task_path:
                 with open(task_path, 'r', encoding='utf-8') as f:
                     tasks = json.load(f)
-                    for t in (tasks if isinstance(tasks, list) else [tasks]):
-                        if t.get("paused", False):
-                            logger.info(f"[-] Skipping paused task: {t.get('name', 'Unknown')}")
-                            continue
-                        run_fetch_task(t)
+                journal = RunJournal(task_path, resume=args.resume)
+                active_tasks = []
+                for t in (tasks if isinstance(tasks, list) else [tasks]):
+                    if args.register and not t.get("register"):
+                        t["register"] = True
+                    if t.get("paused", False):
+                        logger.info(f"[-] Skipping paused task: {t.get('name', 'Unknown')}")
+                        continue
+                    if args.resume and journal.is_done(_task_name(t), task_fingerprint(t, load_task_sql(t)[0])):
+                        logger.info(f"[-] Skipping completed task: {_task_name(t)}")
+                        continue
+                    active_tasks.append(t)
+
+                groups = group_duplicate_tasks(active_tasks)
+                dispatcher = MailDispatcher(coalesce=args.coalesce_mail)
+                # Interleaved tasks cannot be told apart in one thread's profile: those modes are profiled as one batch
+                batch_name = os.path.splitext(os.path.basename(task_path))[0]
+                try:
+                    if args.async_mode:
+                        with profiler.profile(f"batch_{batch_name}"):
+                            asyncio.run(run_batch_async(groups, concurrency=args.concurrency, dispatcher=dispatcher, journal=journal, ta_tabs=args.ta_tabs))
+                    elif args.odps_overlap:
+                        with profiler.profile(f"batch_{batch_name}"):
+                            run_batch_odps_overlap(groups, dispatcher=dispatcher, journal=journal, ta_tabs=args.ta_tabs)
+                    else:
+                        ta_groups, other_groups = split_ta_tab_groups(groups, args.ta_tabs)
+                        if ta_groups:
+                            with profiler.profile(f"ta_tabs_{batch_name}"):
+                                run_ta_tabs(ta_groups, args.ta_tabs, dispatcher=dispatcher, journal=journal)
+                        for t, deps in other_groups:
+                            run_fetch_task(t, dispatcher=dispatcher, dependents=deps, journal=journal)
+                finally:
+                    dispatcher.close()
+                    counts = journal.summary()
+                    logger.info(f"Batch summary: {len(active_tasks)} tasks, {len(groups)} queries run, "
+                                f"{len(active_tasks) - len(groups)} queries saved by deduplication; "
+                                f"{counts.get('ok', 0)} ok, {counts.get('failed', 0)} failed (journal: {journal.path})")
+                    metrics.write_prometheus()
         else:
             # Single CLI runs (ad-hoc) are interactive by default
             run_fetch_task(vars(args), interactive=True)
             
     elif args.command == "predict":
         run_predict_task(args)
+    elif args.command == "local-query":
+        run_local_query(args)
+    elif args.command == "serve":
+        run_serve(args)
     else:
         parser.print_help()
+    profiler.print_summary()
 
 if __name__ == "__main__":
     main()
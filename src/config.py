@@ -16,6 +16,13 @@ class DBConfig:
     user: str = ""
     password: str = ""
 
+@dataclass
+class LocalConfig:
+    fixtures_dir: str = ""
+    latency: float = 0.0
+    repeat: int = 1
+    max_rows: int = 0
+
 @dataclass
 class TAConfig:
     url: str = ""
@@ -79,6 +86,26 @@ class Settings:
     }
     
     TA_SESSION_DIR = os.path.abspath(os.getenv("USER_DATA_DIR", "./ta_session"))
+    # "lean" drops slow_mo and typing delays, blocks images/fonts/media/telemetry and uses low-memory Chromium flags
+    TA_PROFILE = os.getenv('TA_PROFILE', 'default').lower()
+    # Extra host suffixes the lean profile blocks (comma separated), on top of common analytics/telemetry hosts
+    TA_BLOCK_HOSTS = [h.strip() for h in os.getenv('TA_BLOCK_HOSTS', '').split(',') if h.strip()]
+    # Hosts the lean profile treats as first party besides the TA host itself (comma separated, subdomains included)
+    TA_SITE_HOSTS = [h.strip() for h in os.getenv('TA_SITE_HOSTS', '').split(',') if h.strip()]
+    # Results up to this many rows are paged through the IDE's JSON API instead of the download dialog (0 = off)
+    TA_JSON_CAPTURE_MAX_ROWS = int(os.getenv('TA_JSON_CAPTURE_MAX_ROWS', '500000'))
+    TA_JSON_PAGE_SIZE = int(os.getenv('TA_JSON_PAGE_SIZE', '5000'))
+    # IDE tabs opened at once when a batch runs TA tasks side by side (fetch --task ... --ta-tabs)
+    TA_MAX_TABS = int(os.getenv('TA_MAX_TABS', '4'))
+
+    # Concurrent tunnel streams for ODPS Arrow downloads (task option "arrow": true)
+    ODPS_DOWNLOAD_WORKERS = int(os.getenv('ODPS_DOWNLOAD_WORKERS', '4'))
+    # Seconds between status polls when ODPS instances are submitted up front
+    ODPS_POLL_INTERVAL = float(os.getenv('ODPS_POLL_INTERVAL', '5'))
+    # Max connections in the asyncio Hologres pool (fetch --task ... --async)
+    HOLO_ASYNC_POOL_SIZE = int(os.getenv('HOLO_ASYNC_POOL_SIZE', '16'))
+    # Concurrent connections for sharded Hologres reads (task option "shard")
+    HOLO_SHARD_CONNECTIONS = int(os.getenv('HOLO_SHARD_CONNECTIONS', '8'))
 
     # --- Data & Task Path Config ---
     BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -96,11 +123,79 @@ class Settings:
     PREDICT_DIR = os.path.join(TASKS_DIR, "predict")
     PREDICT_INPUT_DIR = os.path.join(PREDICT_DIR, "input")
 
+    # On-disk caches (e.g. the task/SQL file name index)
+    CACHE_DIR = os.path.join(DATA_DIR, "cache")
+    # Local partitioned Parquet stores for incremental tasks
+    STORE_DIR = os.path.abspath(os.getenv('PARTITION_STORE_DIR', os.path.join(DATA_DIR, "store")))
+    # Pre-flight size estimate (Holo EXPLAIN / local count) before each fetch; results with many rows are streamed
+    PREFLIGHT_ENABLED = os.getenv('PREFLIGHT_ENABLED', '1').lower() not in ('0', 'false', 'no')
+    STREAM_MIN_ROWS = int(os.getenv('STREAM_MIN_ROWS', '1000000'))
+    # ODPS only estimates scanned bytes: above this a warning is logged, the fetch and formats are unchanged
+    ODPS_SCAN_WARN_BYTES = int(os.getenv('ODPS_SCAN_WARN_BYTES', str(2 * 1024 ** 3)))
+    STREAM_CHUNK_ROWS = int(os.getenv('STREAM_CHUNK_ROWS', '200000'))
+    # Fetched results registered for `main.py local-query` (task option "register" or LOCAL_DB_REGISTER=1)
+    LOCAL_DB_DIR = os.path.abspath(os.getenv('LOCAL_DB_DIR', os.path.join(DATA_DIR, "localdb")))
+    LOCAL_DB_REGISTER = os.getenv('LOCAL_DB_REGISTER', '0').lower() in ('1', 'true', 'yes')
+    # Post-fetch compaction (task option "compact"): categoricals, downcast numerics, Arrow strings
+    COMPACT_RESULTS = os.getenv('COMPACT_RESULTS', '0').lower() in ('1', 'true', 'yes')
+    # String columns with at most this share of distinct values become categoricals
+    COMPACT_CATEGORICAL_THRESHOLD = float(os.getenv('COMPACT_CATEGORICAL_THRESHOLD', '0.5'))
+    # Compression threads for csv.gz / csv.zst exports (0 = all cores)
+    EXPORT_COMPRESS_THREADS = int(os.getenv('EXPORT_COMPRESS_THREADS', '0'))
+
+    # --- Local Engine (offline load testing) ---
+    LOCAL_ENGINE = LocalConfig(
+        fixtures_dir=os.path.abspath(os.getenv('LOCAL_FIXTURES_DIR', os.path.join(DATA_DIR, "fixtures"))),
+        latency=float(os.getenv('LOCAL_LATENCY', '0')),
+        repeat=int(os.getenv('LOCAL_REPEAT', '1')),
+        max_rows=int(os.getenv('LOCAL_MAX_ROWS', '0'))
+    )
+
+    # --- Batch Runs ---
+    # Per-task defaults, overridable with "retries", "retry_backoff" and "timeout" in the task JSON
+    TASK_RETRIES = int(os.getenv('TASK_RETRIES', '2'))
+    TASK_RETRY_BACKOFF = float(os.getenv('TASK_RETRY_BACKOFF', '10'))
+    TASK_TIMEOUT = float(os.getenv('TASK_TIMEOUT', '0'))
+    JOURNAL_DIR = os.path.join(OUTPUT_DIR, "journal")
+
+    # --- Scheduler Daemon (main.py serve) ---
+    DAEMON_STATUS_FILE = os.getenv('DAEMON_STATUS_FILE', os.path.join(OUTPUT_DIR, "daemon_status.json"))
+    # Local HTTP status endpoint on 127.0.0.1, 0 to disable
+    DAEMON_STATUS_PORT = int(os.getenv('DAEMON_STATUS_PORT', '0'))
+    # Seconds between checks of tasks/configs for changed schedules
+    DAEMON_RELOAD_INTERVAL = float(os.getenv('DAEMON_RELOAD_INTERVAL', '10'))
+
+    # --- Logging Config ---
+    # auto: queue + JSON-lines file for batch (`fetch --task`) and daemon runs, Rich only when interactive
+    # rich: always synchronous Rich console; queue: always queue + JSON-lines file
+    LOG_MODE = os.getenv('LOG_MODE', 'auto').lower()
+    LOG_DIR = os.getenv('LOG_DIR', os.path.join(OUTPUT_DIR, "logs"))
+    # Keep console output in queue mode (rendered by the listener thread, without rich tracebacks)
+    LOG_CONSOLE = os.getenv('LOG_CONSOLE', '1').lower() not in ('0', 'false', 'no')
+
+    # --- Metrics Config ---
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1').lower() not in ('0', 'false', 'no')
+    METRICS_DIR = os.getenv('METRICS_DIR', os.path.join(OUTPUT_DIR, "metrics"))
+    # Optional Prometheus textfile collector target, e.g. C:/prometheus/textfile/fcdc.prom
+    METRICS_PROM_FILE = os.getenv('METRICS_PROM_FILE', '')
+    # `--profile` artifacts (pstats, collapsed stacks, memory top-N)
+    PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(OUTPUT_DIR, "profiles"))
+    # Seconds between stack samples of all threads while profiling
+    PROFILE_SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_INTERVAL', '0.005'))
+    # Allocation sites listed in the memory report
+    PROFILE_MEMORY_TOP_N = int(os.getenv('PROFILE_MEMORY_TOP_N', '25'))
+
     # --- Email Config ---
     SMTP_SERVER = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
     SMTP_PORT = int(os.getenv('SMTP_PORT', '465'))
+    # Socket timeout (seconds) for SMTP connect and every command, so a stuck server cannot hang a batch
+    SMTP_TIMEOUT = float(os.getenv('SMTP_TIMEOUT', '60'))
     SENDER_EMAIL = os.getenv('SENDER_EMAIL', '')
     SENDER_PASSWORD = os.getenv('SENDER_PASSWORD', '')
+    # Attachment compression: none (attachments as exported), zip or gzip
+    MAIL_COMPRESSION = os.getenv('MAIL_COMPRESSION', 'none').lower()
+    # Max encoded attachment bytes per message; larger sets are split across several emails
+    MAIL_MAX_BYTES = int(os.getenv('MAIL_MAX_BYTES', str(20 * 1024 * 1024)))
 
     def __post_init__(self):
         # 确保目录存在
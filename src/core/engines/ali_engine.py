@@ -1,30 +1,225 @@
+import re
+import time
+import uuid
+import queue
+import asyncio
+import threading
+import functools
+import contextvars
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from odps import ODPS
-from src.core.engines.base_engine import BaseEngine
+from src.core.engines.base_engine import BaseEngine, subquery
 from src.config import settings, DBConfig
 from src.utils.logger import logger
+from src.utils.metrics import metrics, frame_nbytes
 
 class ODPSEngine(BaseEngine):
     def __init__(self, config: DBConfig):
         self.config = config
+        self._odps = None
 
-    def fetch(self, sql: str, **kwargs) -> pd.DataFrame:
-        logger.info(f"Connecting to ODPS Project: {self.config.project}...")
-        o = ODPS(
-            self.config.access_id, 
-            self.config.access_key, 
-            self.config.project, 
-            endpoint=self.config.endpoint
-        )
+    def _client(self):
+        if self._odps is None:
+            logger.info(f"Connecting to ODPS Project: {self.config.project}...")
+            with metrics.span("connect", engine="odps"):
+                self._odps = ODPS(
+                    self.config.access_id, 
+                    self.config.access_key, 
+                    self.config.project, 
+                    endpoint=self.config.endpoint
+                )
+        return self._odps
+
+    def warm(self, **kwargs):
+        self._client()
+
+    def fetch(self, sql: str, arrow=False, workers=None, timeout=None, **kwargs):
+        """
+        Run SQL and return a DataFrame, or a pyarrow Table when arrow=True.
+        The Arrow path reads the result through the instance tunnel's Arrow reader over
+        `workers` concurrent range downloads and skips the per-record Python decode.
+        With `timeout` (seconds) the instance is stopped and TimeoutError raised if it runs longer.
+        """
+        instance = self.submit(sql)
+        self._wait(instance, timeout)
+        return self.collect(instance, arrow=arrow, workers=workers)
+
+    def _wait(self, instance, timeout=None):
+        from odps.errors import WaitTimeoutError
+        with metrics.span("execute", engine="odps"):
+            try:
+                instance.wait_for_success(timeout=timeout)
+            except WaitTimeoutError:
+                self.stop_timed_out(instance, timeout)
+
+    def fetch_chunks(self, sql: str, chunksize: int = 100000, timeout=None, **kwargs):
+        """Run SQL, then download the result through the instance tunnel in ranges of `chunksize` rows."""
+        instance = self.submit(sql)
+        self._wait(instance, timeout)
+        with instance.open_reader(tunnel=True) as reader:
+            count = reader.count
+            logger.info(f"Streaming {count:,} rows in chunks of {chunksize:,}...")
+            if not count:
+                yield reader.to_pandas()
+                return
+            for start in range(0, count, chunksize):
+                with metrics.span("download", engine="odps", mode="chunk") as span:
+                    df = reader.to_pandas(start=start, count=min(chunksize, count - start))
+                    span["rows"], span["bytes"] = len(df), frame_nbytes(df)
+                yield df
+
+    def estimate(self, sql: str, **kwargs):
+        """
+        SQL cost estimate. ODPS only reports how many bytes the query scans, not the result size,
+        so rows/bytes stay None and the scan size is returned as scan_bytes.
+        """
+        with metrics.span("estimate", engine="odps") as span:
+            cost = self._client().execute_sql_cost(sql)
+            span["bytes"] = cost.input_size
+        logger.info(f"ODPS cost estimate: input {(cost.input_size or 0) / 2**30:.2f} GB, "
+                    f"complexity {cost.complexity}, {cost.udf_num} UDFs")
+        return {"rows": None, "bytes": None, "scan_bytes": cost.input_size}
+
+    @staticmethod
+    def stop_timed_out(instance, timeout):
+        """Stop an instance that ran past `timeout` seconds and raise TimeoutError (used by callers that poll instances themselves)."""
+        try:
+            instance.stop()
+        except Exception as e:
+            logger.warning(f"Failed to stop ODPS instance {instance.id}: {e}")
+        raise TimeoutError(f"ODPS instance {instance.id} did not finish within {timeout}s")
+
+    def submit(self, sql: str):
+        """Submit SQL as an asynchronous ODPS instance and return it without waiting."""
+        o = self._client()
         hints = {"odps.sql.submit.mode": "script"}
-        with o.execute_sql(sql, hints=hints).open_reader() as reader:
-            return reader.to_pandas()
+        with metrics.span("submit", engine="odps"):
+            instance = o.run_sql(sql, hints=hints)
+        logger.info(f"Submitted ODPS instance {instance.id}")
+        return instance
+
+    def collect(self, instance, arrow=False, workers=None):
+        """Download the result of a successfully finished instance."""
+        if arrow:
+            return self._download_arrow(instance, workers or settings.ODPS_DOWNLOAD_WORKERS)
+        with metrics.span("download", engine="odps") as span:
+            with instance.open_reader() as reader:
+                df = reader.to_pandas()
+            span["rows"], span["bytes"] = len(df), frame_nbytes(df)
+        return df
+
+    @staticmethod
+    def finished(pending):
+        """
+        One lightweight status poll over {key: instance}. Returns the keys whose instances
+        have terminated (successfully or not); call instance.wait_for_success() to raise on failure.
+        """
+        return [key for key, instance in pending.items() if instance.is_terminated()]
+
+    async def afetch(self, sql: str, arrow=False, workers=None, timeout=None, **kwargs):
+        """Submit, then poll status from the event loop instead of parking a thread on wait_for_success."""
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        instance = await loop.run_in_executor(None, ctx.run, self.submit, sql)
+        start = time.perf_counter()
+        while not await loop.run_in_executor(None, instance.is_terminated):
+            if timeout and time.perf_counter() - start > timeout:
+                await loop.run_in_executor(None, self.stop_timed_out, instance, timeout)
+            await asyncio.sleep(settings.ODPS_POLL_INTERVAL)
+        metrics.record("execute", time.perf_counter() - start, engine="odps")
+        await loop.run_in_executor(None, instance.wait_for_success)
+        return await loop.run_in_executor(None, functools.partial(ctx.run, self.collect, instance, arrow=arrow, workers=workers))
+
+    def _arrow_session(self, instance):
+        from odps.tunnel import InstanceTunnel
+        return InstanceTunnel(self._client()).create_download_session(instance)
+
+    @staticmethod
+    def _split_ranges(count, workers, min_rows=50000):
+        """Split [0, count) into at most `workers` contiguous (start, length) ranges."""
+        parts = max(1, min(workers, count // min_rows or 1))
+        step = -(-count // parts) if count else 0
+        return [(start, min(step, count - start)) for start in range(0, count, step)] if count else []
+
+    def _download_arrow(self, instance, workers):
+        try:
+            import pyarrow as pa
+        except ImportError:
+            logger.error("Module 'pyarrow' not found. Please install pyarrow for Arrow downloads.")
+            raise
+
+        with metrics.span("download", engine="odps", mode="arrow", workers=workers) as span:
+            session = self._arrow_session(instance)
+            ranges = self._split_ranges(session.count, workers)
+            logger.info(f"Downloading {session.count:,} rows over {len(ranges)} Arrow stream(s)...")
+
+            def read_range(rng):
+                start, count = rng
+                return session.open_arrow_reader(start, count).read()
+
+            if len(ranges) > 1:
+                with ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+                    tables = list(pool.map(read_range, ranges))
+            else:
+                tables = [read_range(r) for r in ranges]
+
+            if tables:
+                table = pa.concat_tables(tables)
+            else:
+                table = session.open_arrow_reader(0, 0).read()
+            span["rows"], span["bytes"] = table.num_rows, table.nbytes
+        return table
+
+_SHARD_DONE = object()
+
+def shard_queries(sql, shard):
+    """
+    Split one query into disjoint shard queries. `shard` is the task's "shard" block:
+      {"key": "user_id", "count": 8}                       hash of the key (hashtext), 8 shards
+      {"key": "user_id", "count": 8, "mode": "mod"}       integer key modulo 8
+      {"key": "ds", "bounds": ["20250101", "20250201", "20250301"]}  key ranges < b1, >= b1
+    Range bounds only place the split points: keys below the second bound fall in the first
+    shard and keys at or above the last inner bound in the last one, so no row is dropped.
+    The predicate replaces ${shard} in the SQL, or filters the wrapped query (the key must then
+    be a result column). Rows with a NULL key go to the first shard.
+    """
+    key, mode = shard["key"], shard.get("mode", "range" if shard.get("bounds") else "hash")
+    if mode == "range":
+        literal = lambda v: str(v) if isinstance(v, (int, float)) else "'" + str(v).replace("'", "''") + "'"
+        splits = [literal(b) for b in shard["bounds"][1:-1]]
+        if len(shard["bounds"]) < 2:
+            predicates = []
+        elif not splits:
+            predicates = ["TRUE"]
+        else:
+            predicates = ([f"{key} < {splits[0]}"]
+                          + [f"({key} >= {lo} AND {key} < {hi})" for lo, hi in zip(splits, splits[1:])]
+                          + [f"{key} >= {splits[-1]}"])
+    elif mode in ("hash", "mod"):
+        n = int(shard.get("count", settings.HOLO_SHARD_CONNECTIONS))
+        expr = f"hashtext(CAST({key} AS TEXT))" if mode == "hash" else key
+        # ((x % n) + n) % n keeps negative hashes/ids in 0..n-1
+        predicates = [f"((({expr}) % {n}) + {n}) % {n} = {i}" for i in range(n)]
+    else:
+        raise ValueError(f"unknown shard mode '{mode}' (use hash, mod or range)")
+    if not predicates:
+        raise ValueError("shard needs a count > 0 or at least two bounds")
+    predicates[0] = f"({predicates[0]} OR {key} IS NULL)"
+
+    body = sql.strip().rstrip(";")
+    if "${shard}" in body:
+        return [body.replace("${shard}", p) for p in predicates]
+    return [f"SELECT * FROM {subquery(sql)} AS fcdc_shard WHERE {p}" for p in predicates]
 
 class HoloEngine(BaseEngine):
     def __init__(self, config: DBConfig):
         self.config = config
+        self._async_pool = None
+        self._keep_alive = False
+        self._conn = None
 
-    def fetch(self, sql: str, **kwargs) -> pd.DataFrame:
+    def _open_connection(self):
         try:
             import psycopg2
         except ImportError:
@@ -32,14 +227,228 @@ class HoloEngine(BaseEngine):
             raise
 
         logger.info(f"Connecting to Hologres: {self.config.host}...")
-        conn = psycopg2.connect(
-            host=self.config.host, 
-            port=self.config.port,
-            dbname=self.config.dbname, 
-            user=self.config.user,
-            password=self.config.password
-        )
+        with metrics.span("connect", engine="holo"):
+            return psycopg2.connect(
+                host=self.config.host, 
+                port=self.config.port,
+                dbname=self.config.dbname, 
+                user=self.config.user,
+                password=self.config.password
+            )
+
+    def _connect(self):
+        if self._conn is not None and not self._conn.closed:
+            return self._conn
+        conn = self._open_connection()
+        if self._keep_alive:
+            # Autocommit so an idle kept-alive connection never sits inside an open transaction
+            conn.autocommit = True
+            self._conn = conn
+        return conn
+
+    def warm(self, **kwargs):
+        """Keep one connection open across fetch() calls."""
+        self._keep_alive = True
+        self._connect()
+
+    def close(self):
+        self._keep_alive = False
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def fetch(self, sql: str, timeout=None, shard=None, **kwargs) -> pd.DataFrame:
+        if shard:
+            chunks = list(self.fetch_chunks(sql, chunksize=500000, timeout=timeout, shard=shard))
+            with metrics.span("dataframe", engine="holo") as span:
+                df = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+                span["rows"], span["bytes"] = len(df), frame_nbytes(df)
+            return df
+        conn = self._connect()
+        try:
+            # A client-side cursor transfers the whole result during execute()
+            with metrics.span("execute", engine="holo") as span:
+                with conn.cursor() as cur:
+                    # Always set, so a kept-alive connection never inherits a previous task's limit
+                    cur.execute("SET statement_timeout = %s", (int(timeout * 1000) if timeout else 0,))
+                    cur.execute(sql)
+                    columns = [d[0] for d in cur.description]
+                    rows = cur.fetchall()
+                span["rows"] = len(rows)
+            with metrics.span("dataframe", engine="holo") as span:
+                df = pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+                span["rows"], span["bytes"] = len(df), frame_nbytes(df)
+            return df
+        except Exception:
+            if conn is self._conn:
+                # Drop a kept connection after errors (e.g. server restart) so the next fetch reconnects
+                self.close()
+                self._keep_alive = True
+            raise
+        finally:
+            if conn is not self._conn:
+                conn.close()
+
+    def fetch_chunks(self, sql: str, chunksize: int = 100000, timeout=None, shard=None, **kwargs):
+        """
+        Stream a query through a server-side cursor on its own connection, so only one chunk
+        of `chunksize` rows is held in memory at a time. With `shard` the query is split into
+        disjoint shards that stream concurrently over separate connections.
+        """
+        if shard:
+            return self._sharded_chunks(shard_queries(sql, shard), chunksize, timeout)
+        return self._stream_query(sql, chunksize, timeout)
+
+    def _sharded_chunks(self, queries, chunksize, timeout):
+        """Run shard queries on up to HOLO_SHARD_CONNECTIONS connections and yield chunks as they arrive."""
+        workers = min(len(queries), settings.HOLO_SHARD_CONNECTIONS)
+        logger.info(f"Reading {len(queries)} shards over {workers} Hologres connections...")
+        # Bounded, so fast shards wait for the consumer instead of buffering the whole result
+        out = queue.Queue(maxsize=workers * 2)
+        stop = threading.Event()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    out.put(item, timeout=1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def run(shard_sql):
+            try:
+                for chunk in self._stream_query(shard_sql, chunksize, timeout):
+                    if not put(chunk):
+                        return
+            except Exception as e:
+                put(e)
+            finally:
+                put(_SHARD_DONE)
+
+        pool = ThreadPoolExecutor(max_workers=workers)
+        for shard_sql in queries:
+            pool.submit(contextvars.copy_context().run, run, shard_sql)
+        done, emitted, empty = 0, 0, None
         try:
-            return pd.read_sql(sql, conn)
+            with metrics.span("shards", engine="holo", shards=len(queries), connections=workers) as span:
+                while done < len(queries):
+                    item = out.get()
+                    if item is _SHARD_DONE:
+                        done += 1
+                    elif isinstance(item, Exception):
+                        raise item
+                    elif len(item):
+                        emitted += len(item)
+                        yield item
+                    else:
+                        empty = item
+                span["rows"] = emitted
+            if not emitted and empty is not None:
+                yield empty
+        finally:
+            stop.set()
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _stream_query(self, sql, chunksize, timeout=None):
+        conn = self._open_connection()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SET statement_timeout = %s", (int(timeout * 1000) if timeout else 0,))
+            with conn.cursor(name=f"fcdc_{uuid.uuid4().hex[:12]}") as cur:
+                cur.itersize = chunksize
+                with metrics.span("execute", engine="holo"):
+                    cur.execute(sql)
+                    rows = cur.fetchmany(chunksize)
+                columns = [d[0] for d in cur.description]
+                if not rows:
+                    yield pd.DataFrame(columns=columns)
+                while rows:
+                    yield pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+                    rows = cur.fetchmany(chunksize)
         finally:
             conn.close()
+
+    def estimate(self, sql: str, shard=None, **kwargs):
+        """Planner estimate from EXPLAIN: rows and row width of the top plan node."""
+        if shard:
+            # Estimate the whole result: the shard placeholder matches every row
+            sql = sql.replace("${shard}", "TRUE")
+        conn = self._connect()
+        try:
+            with metrics.span("estimate", engine="holo") as span:
+                with conn.cursor() as cur:
+                    cur.execute(f"EXPLAIN {sql}")
+                    plan = "\n".join(str(r[0]) for r in cur.fetchall())
+                match = re.search(r"rows=(\d+)\s+width=(\d+)", plan)
+                if match:
+                    span["rows"], span["bytes"] = int(match.group(1)), int(match.group(1)) * int(match.group(2))
+        finally:
+            if conn is not self._conn:
+                conn.close()
+        if not match:
+            logger.warning("Could not read a row estimate from the Hologres plan.")
+            return None
+        logger.info(f"Hologres plan estimate: {span['rows']:,} rows, ~{span['bytes'] / 2**20:.0f} MB")
+        return {"rows": span["rows"], "bytes": span["bytes"]}
+
+    async def _get_async_pool(self):
+        if self._async_pool is None:
+            try:
+                import asyncpg
+            except ImportError:
+                logger.error("Module 'asyncpg' not found. Please install asyncpg for async Hologres queries.")
+                raise
+
+            logger.info(f"Opening async Hologres pool: {self.config.host} (max {settings.HOLO_ASYNC_POOL_SIZE})...")
+            with metrics.span("connect", engine="holo"):
+                self._async_pool = await asyncpg.create_pool(
+                    host=self.config.host,
+                    port=self.config.port,
+                    database=self.config.dbname,
+                    user=self.config.user,
+                    password=self.config.password,
+                    min_size=1,
+                    max_size=settings.HOLO_ASYNC_POOL_SIZE,
+                )
+        return self._async_pool
+
+    async def afetch_chunks(self, sql: str, chunksize: int = 100000, timeout=None, **kwargs):
+        """Stream a query through a server-side cursor on a pooled asyncpg connection."""
+        pool = await self._get_async_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                if timeout:
+                    await conn.execute(f"SET LOCAL statement_timeout = {int(timeout * 1000)}")
+                with metrics.span("execute", engine="holo"):
+                    stmt = await conn.prepare(sql)
+                    columns = [attr.name for attr in stmt.get_attributes()]
+                    cursor = await stmt.cursor()
+                emitted = 0
+                while True:
+                    records = await cursor.fetch(chunksize)
+                    if not records:
+                        break
+                    emitted += len(records)
+                    yield pd.DataFrame.from_records([tuple(r) for r in records], columns=columns, coerce_float=True)
+                if not emitted:
+                    yield pd.DataFrame(columns=columns)
+
+    async def afetch(self, sql: str, shard=None, **kwargs) -> pd.DataFrame:
+        if shard:
+            # Shards share the asyncpg pool, so at most HOLO_ASYNC_POOL_SIZE run at once
+            async def collect(shard_sql):
+                return [chunk async for chunk in self.afetch_chunks(shard_sql, **kwargs)]
+            parts = await asyncio.gather(*[collect(q) for q in shard_queries(sql, shard)])
+            chunks = [c for part in parts for c in part if len(c)] or parts[0][:1]
+        else:
+            chunks = [chunk async for chunk in self.afetch_chunks(sql, **kwargs)]
+        with metrics.span("dataframe", engine="holo") as span:
+            df = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
+            span["rows"], span["bytes"] = len(df), frame_nbytes(df)
+        return df
+
+    async def aclose(self):
+        if self._async_pool is not None:
+            await self._async_pool.close()
+            self._async_pool = None
@@ -1,6 +1,26 @@
 from abc import ABC, abstractmethod
+import asyncio
+import functools
+import contextvars
 import pandas as pd
-from typing import Union, List, Dict
+from typing import Union, List, Dict, Iterator
+
+def subquery(sql: str) -> str:
+    """
+    SQL as a parenthesized subquery, e.g. for SELECT ... FROM {subquery(sql)} AS q. The closing
+    paren goes on its own line so a trailing -- comment cannot swallow it.
+    """
+    lines = sql.strip().splitlines()
+    # Drop trailing comment-only lines so a final ';' before them is stripped too
+    while lines and (not lines[-1].strip() or lines[-1].strip().startswith("--")):
+        lines.pop()
+    if lines and "--" in lines[-1]:
+        # Cut a trailing comment on the last code line unless the '--' sits inside a string literal
+        code = lines[-1][:lines[-1].index("--")]
+        if code.count("'") % 2 == 0:
+            lines[-1] = code
+    body = "\n".join(lines).rstrip().rstrip(";")
+    return f"(\n{body}\n)"
 
 class BaseEngine(ABC):
     """
@@ -12,3 +32,43 @@ class BaseEngine(ABC):
         Execute SQL and return data.
         """
         pass
+
+    def fetch_chunks(self, sql: str, chunksize: int = 100000, **kwargs) -> Iterator[pd.DataFrame]:
+        """
+        Execute SQL and yield the result as DataFrames of at most `chunksize` rows.
+        Engines that can stream from the server override this; the default fetches
+        everything and slices it, so callers can rely on the interface for any engine.
+        """
+        results = self.fetch(sql, **kwargs)
+        if not isinstance(results, pd.DataFrame):
+            raise NotImplementedError(f"{type(self).__name__} does not return tabular results that can be chunked.")
+        for start in range(0, len(results), chunksize):
+            yield results.iloc[start:start + chunksize]
+
+    def estimate(self, sql: str, **kwargs):
+        """
+        Pre-flight size estimate without running the query: {"rows": int or None, "bytes": int or None},
+        or None when the engine cannot tell.
+        """
+        return None
+
+    async def afetch(self, sql: str, **kwargs) -> Union[pd.DataFrame, List[Dict]]:
+        """
+        Async variant of fetch(). Engines with a native async driver override this;
+        blocking engines run fetch() in the loop's default executor so they never stall the loop.
+        """
+        loop = asyncio.get_running_loop()
+        ctx = contextvars.copy_context()
+        return await loop.run_in_executor(None, functools.partial(ctx.run, self.fetch, sql, **kwargs))
+
+    def warm(self, **kwargs):
+        """Open connections/sessions ahead of time and keep them across fetches (long-running daemon)."""
+        pass
+
+    def close(self):
+        """Release anything kept open by warm()."""
+        pass
+
+    async def aclose(self):
+        """Release async resources (connection pools) held by the engine."""
+        pass
@@ -0,0 +1,115 @@
+import os
+import time
+import sqlite3
+import pandas as pd
+from src.core.engines.base_engine import BaseEngine, subquery
+from src.config import LocalConfig
+from src.utils.logger import logger
+from src.utils.metrics import metrics, frame_nbytes
+
+FIXTURE_EXTS = ('.csv', '.parquet')
+
+class LocalEngine(BaseEngine):
+    """
+    Offline engine that runs task SQL against local CSV/Parquet fixtures, for load testing
+    the batch, export and email paths without Aliyun or ThinkingData access.
+    Every file in the fixtures directory is exposed as a table named after its file stem
+    (events.csv -> events). DuckDB is used when installed, otherwise SQLite.
+
+    Artificial shaping, from config or per call:
+      latency  - seconds to sleep before the first row, simulating server execution
+      repeat   - emit every result row this many times, to inflate result sizes
+      max_rows - truncate the (inflated) result, 0 for no limit
+    """
+    def __init__(self, config: LocalConfig):
+        self.config = config
+
+    def _fixtures(self):
+        if not os.path.isdir(self.config.fixtures_dir):
+            return {}
+        return {
+            os.path.splitext(f)[0]: os.path.join(self.config.fixtures_dir, f)
+            for f in sorted(os.listdir(self.config.fixtures_dir))
+            if f.lower().endswith(FIXTURE_EXTS)
+        }
+
+    def _connect(self):
+        fixtures = self._fixtures()
+        if not fixtures:
+            logger.warning(f"No CSV/Parquet fixtures found in {self.config.fixtures_dir}")
+        try:
+            import duckdb
+        except ImportError:
+            duckdb = None
+
+        if duckdb is not None:
+            conn = duckdb.connect()
+            for table, path in fixtures.items():
+                reader = "read_parquet" if path.lower().endswith('.parquet') else "read_csv_auto"
+                escaped = path.replace("'", "''")
+                conn.execute(f'CREATE VIEW "{table}" AS SELECT * FROM {reader}(\'{escaped}\')')
+            return conn
+
+        conn = sqlite3.connect(":memory:", check_same_thread=False)
+        for table, path in fixtures.items():
+            df = pd.read_parquet(path) if path.lower().endswith('.parquet') else pd.read_csv(path)
+            df.to_sql(table, conn, index=False)
+        return conn
+
+    def _shape(self, latency, repeat, max_rows):
+        latency = self.config.latency if latency is None else latency
+        repeat = self.config.repeat if repeat is None else repeat
+        max_rows = self.config.max_rows if max_rows is None else max_rows
+        return float(latency or 0), max(int(repeat or 1), 1), int(max_rows or 0)
+
+    def fetch_chunks(self, sql: str, chunksize: int = 100000, latency=None, repeat=None, max_rows=None, **kwargs):
+        latency, repeat, max_rows = self._shape(latency, repeat, max_rows)
+        logger.info(f"Connecting to local fixtures: {self.config.fixtures_dir}...")
+        with metrics.span("connect", engine="local"):
+            conn = self._connect()
+        try:
+            with metrics.span("execute", engine="local"):
+                cur = conn.execute(sql)
+                if latency:
+                    time.sleep(latency)
+            columns = [d[0] for d in cur.description]
+
+            emitted = 0
+            # Fetch at most chunksize source rows per round so inflated chunks stay near chunksize
+            fetch_size = max(chunksize // repeat, 1)
+            while True:
+                rows = cur.fetchmany(fetch_size)
+                if not rows:
+                    if not emitted:
+                        yield pd.DataFrame(columns=columns)
+                    break
+                chunk = pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+                if repeat > 1:
+                    chunk = pd.concat([chunk] * repeat, ignore_index=True)
+                if max_rows and emitted + len(chunk) >= max_rows:
+                    yield chunk.iloc[:max_rows - emitted].reset_index(drop=True)
+                    return
+                emitted += len(chunk)
+                yield chunk
+        finally:
+            conn.close()
+
+    def estimate(self, sql: str, repeat=None, max_rows=None, **kwargs):
+        """Exact row count of the (inflated) result; fixtures are local, so counting is cheap."""
+        _, repeat, max_rows = self._shape(None, repeat, max_rows)
+        conn = self._connect()
+        try:
+            rows = conn.execute(f"SELECT COUNT(*) FROM {subquery(sql)} AS q").fetchone()[0] * repeat
+        finally:
+            conn.close()
+        return {"rows": min(rows, max_rows) if max_rows else rows, "bytes": None}
+
+    def fetch(self, sql: str, **kwargs) -> pd.DataFrame:
+        chunks = list(self.fetch_chunks(sql, **kwargs))
+        with metrics.span("dataframe", engine="local") as span:
+            if chunks:
+                df = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0].reset_index(drop=True)
+            else:
+                df = pd.DataFrame()
+            span["rows"], span["bytes"] = len(df), frame_nbytes(df)
+        return df
@@ -1,15 +1,51 @@
 import os
+import csv
+import json
 import shutil
 import stat
 import time
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
 from playwright.sync_api import sync_playwright
 from src.core.engines.base_engine import BaseEngine
 from src.utils.logger import logger
+from src.utils.metrics import metrics, child_rss_bytes
 from src.config import settings
 
 class _BrowserLaunchFailed(Exception):
     pass
 
+class _TooManyRows(Exception):
+    pass
+
+# Parameter names the IDE's result API may use for paging, and response fields holding the total
+PAGE_KEYS = ["pageNum", "pageNo", "page", "current", "pageIndex"]
+OFFSET_KEYS = ["offset", "start"]
+SIZE_KEYS = ["pageSize", "size", "limit"]
+TOTAL_KEYS = ["total", "totalCount", "totalRows", "rowCount"]
+
+# Lean profile: resource types the IDE works without, and analytics/telemetry hosts it calls
+LEAN_BLOCKED_TYPES = {"image", "media", "font", "texttrack", "manifest", "ping"}
+LEAN_BLOCKED_HOSTS = [
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net", "sentry.io",
+    "hm.baidu.com", "cnzz.com", "growingio.com", "sensorsdata.cn", "mixpanel.com", "hotjar.com",
+]
+LEAN_CHROMIUM_ARGS = [
+    "--disable-extensions",
+    "--disable-background-networking",
+    "--disable-component-update",
+    "--disable-default-apps",
+    "--disable-sync",
+    "--disable-features=Translate,MediaRouter,OptimizationHints",
+    "--no-first-run",
+    "--mute-audio",
+    "--renderer-process-limit=4",
+    "--js-flags=--max-old-space-size=1024",
+]
+
+def _host_matches(host, suffixes):
+    """True if host is one of `suffixes` or a subdomain of one (dot boundary: evilexample.com is not example.com)."""
+    return any(host == s or host.endswith("." + s) for s in suffixes)
+
 class ThinkingDataEngine(BaseEngine):
     """
     Engine for ThinkingData platform using Playwright automation.
@@ -22,6 +58,11 @@ class ThinkingDataEngine(BaseEngine):
         self.username = config.user
         self.password = config.password
         self.user_data_dir = settings.TA_SESSION_DIR
+        self.profile = settings.TA_PROFILE
+        self._playwright = None
+        self._warm_context = None
+        # page -> its "response" listener, removed once the result is captured or handed to the download path
+        self._interceptors = {}
 
     def _context_options(self, headless=False, show_window=False):
         args = [
@@ -30,10 +71,13 @@ class ThinkingDataEngine(BaseEngine):
         ]
         if not headless:
             args.append("--window-position=0,0" if show_window else "--window-position=-10000,-10000")
+        if self.profile == "lean":
+            args.extend(LEAN_CHROMIUM_ARGS)
 
         return {
             "headless": headless,
-            "slow_mo": 100,
+            # The default profile throttles every action; the lean profile relies on explicit waits
+            "slow_mo": 0 if self.profile == "lean" else 100,
             "viewport": {"width": 1920, "height": 1080},
             "user_agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
             "args": args,
@@ -42,10 +86,33 @@ class ThinkingDataEngine(BaseEngine):
 
     def _launch_persistent_context(self, chromium, headless=False, show_window=False):
         os.makedirs(self.user_data_dir, exist_ok=True)
-        return chromium.launch_persistent_context(
+        context = chromium.launch_persistent_context(
             self.user_data_dir,
             **self._context_options(headless=headless, show_window=show_window)
         )
+        if self.profile == "lean":
+            context.route("**/*", self._route_lean)
+        return context
+
+    def _route_lean(self, route):
+        """Abort requests the IDE does not need: images, fonts, media, telemetry and third-party calls."""
+        request = route.request
+        host = urlparse(request.url).hostname or ""
+        # First party is the configured TA host (and its subdomains) plus TA_SITE_HOSTS
+        sites = [s for s in [urlparse(self.base_url).hostname or ""] + settings.TA_SITE_HOSTS if s]
+        blocked = (
+            request.resource_type in LEAN_BLOCKED_TYPES
+            or _host_matches(host, LEAN_BLOCKED_HOSTS + settings.TA_BLOCK_HOSTS)
+            # Third-party scripts and styles may be the SPA's own CDN assets, so only their other calls are dropped
+            or (host and sites and not _host_matches(host, sites) and request.resource_type not in ("document", "script", "stylesheet"))
+        )
+        try:
+            if blocked:
+                route.abort()
+            else:
+                route.continue_()
+        except Exception:
+            pass
 
     def _reset_session_after_launch_error(self, exc):
         logger.warning(f"Saved TA browser session failed to launch: {exc}")
@@ -117,9 +184,9 @@ class ThinkingDataEngine(BaseEngine):
             element.click(force=True)
 
     def fetch(self, sql: str, **kwargs) -> list:
-        return self.run_sql_query(sql_text=sql, show_window=kwargs.get('headless', True) == False)
+        return self.run_sql_query(sql_text=sql, show_window=kwargs.get('headless', True) == False, timeout=kwargs.get('timeout'))
 
-    def run_sql_query(self, sql_text=None, headless=True, show_window=False, _retried=False, _retried_launch=False):
+    def run_sql_query(self, sql_text=None, headless=True, show_window=False, timeout=None, _retried=False, _retried_launch=False):
         """Run SQL via browser automation. Always uses headed mode with off-screen window for reliable SPA rendering."""
         # Headless Chromium cannot reliably render heavy JS SPAs (like ThinkingData IDE).
         # We always use headed mode; if show_window=False, the window is positioned off-screen.
@@ -127,59 +194,39 @@ class ThinkingDataEngine(BaseEngine):
         class _NeedsFreshLogin(Exception):
             pass
 
+        if self._warm_context is not None:
+            try:
+                page = self._warm_context.new_page()
+            except Exception as e:
+                # Browser crashed or was closed: drop the warm session and fall back to a cold launch
+                logger.warning(f"Warm TA browser unusable ({e}); relaunching.")
+                self.close()
+            else:
+                return self._run_warm_query(page, sql_text, timeout)
+
         results_data = []
+        failure = None
 
         try:
             with sync_playwright() as p:
                 try:
-                    context = self._launch_persistent_context(
-                        p.chromium,
-                        headless=False,  # Always headed: headless mode cannot render the SPA reliably
-                        show_window=show_window,
-                    )
+                    with metrics.span("connect", engine="ta"):
+                        context = self._launch_persistent_context(
+                            p.chromium,
+                            headless=False,  # Always headed: headless mode cannot render the SPA reliably
+                            show_window=show_window,
+                        )
                 except Exception as exc:
                     if _retried_launch:
                         raise
                     self._reset_session_after_launch_error(exc)
                     raise _BrowserLaunchFailed()
                 page = context.new_page()
-
-                def handle_response(response):
-                    try:
-                        if response.status == 200 and "json" in response.headers.get("content-type", "").lower():
-                            data = response.json()
-                            payload = data.get("data", data) if isinstance(data, dict) else data
-                            if isinstance(payload, dict):
-                                for key in ["rows", "result", "results", "list"]:
-                                    if key in payload and isinstance(payload[key], list) and len(payload[key]) > 0:
-                                        if any(k in payload for k in ["header", "columns", "headers"]):
-                                            results_data.append(payload)
-                                            logger.info(f"Intercepted data via key [{key}]: {len(payload[key])} rows.")
-                                            return
-                    except:
-                        pass
-
-                page.on("response", handle_response)
-
-                logger.info(f"Opening IDE page: {self.sql_url}")
-                page.goto(self.sql_url)
-                # Wait for the SPA to finish loading (networkidle = no network requests for 500ms)
-                try:
-                    page.wait_for_load_state("networkidle", timeout=30000)
-                except:
-                    pass
+                self._intercept_results(page, results_data)
+                self._open_ide(page)
 
                 try:
-                    # Wait for login page or editor to appear
-                    try:
-                        page.wait_for_selector(
-                            ".monaco-editor, .CodeMirror, .ace_editor, textarea, div[class*='content___'], input[type='password']",
-                            timeout=20000
-                        )
-                    except:
-                        pass
-
-                    needs_login = "login" in page.url.lower() or bool(page.query_selector('input[type="password"]'))
+                    needs_login = self._needs_login(page)
 
                     if needs_login:
                         if not _retried:
@@ -199,128 +246,19 @@ class ThinkingDataEngine(BaseEngine):
                             pass
 
                     if sql_text:
-                        logger.info("Injecting SQL into editor...")
-                        editor_selector = ".monaco-editor, .CodeMirror, .ace_editor, textarea, div[class*='content___'], .tant-monaco-editor"
-                        editor = page.wait_for_selector(editor_selector, timeout=30000)
-                        self._js_click(page, editor)
-
-                        page.keyboard.press("Control+A")
-                        page.keyboard.press("Backspace")
-                        page.wait_for_timeout(1000)
-
-                        # Direct Monaco injection
-                        try:
-                            success = page.evaluate("""(text) => {
-                                if (window.monaco && monaco.editor.getModels().length > 0) {
-                                    monaco.editor.getModels()[0].setValue(text);
-                                    return true;
-                                }
-                                return false;
-                            }""", sql_text)
-                        except:
-                            success = False
-
-                        if not success:
-                            self._js_click(page, editor)
-                            page.keyboard.press("Control+A")
-                            page.keyboard.press("Backspace")
-                            page.keyboard.insert_text(sql_text)
-
-                        page.wait_for_timeout(2000)
-
-                        # Trigger Calculate — JS click bypasses overlay masks
-                        calc_btn = page.query_selector('button:has-text("Calculate"), button:has-text("计算"), .ant-btn:has-text("计算")')
-                        if calc_btn:
-                            logger.info("Triggering 'Calculate' button...")
-                            self._js_click(page, calc_btn)
-                        else:
-                            logger.info("Triggering Ctrl+Enter...")
-                            page.keyboard.press("Control+Enter")
+                        with metrics.span("submit", engine="ta"):
+                            self._submit_sql(page, sql_text)
 
                     # Polling loop: wait for download button or error
                     logger.info("Waiting for data (checking engine status)...")
-                    max_timeout = 3600
-                    start_time = time.time()
-
-                    while not results_data and (time.time() - start_time < max_timeout):
-                        # 1. Download button detection
-                        download_selectors = [
-                            'button:has-text("Download All")', 'button:has-text("全量下载")',
-                            '.ant-btn:has-text("全量下载")', 'span:has-text("全量下载")',
-                            '.anticon-download', '.anticon-export', '.ide-download-btn'
-                        ]
-                        download_btn = None
-                        for sel in download_selectors:
-                            btn = page.query_selector(sel)
-                            if btn and btn.is_visible():
-                                download_btn = btn
-                                break
-
-                        if download_btn:
-                            inner_text = ""
-                            try:
-                                inner_text = download_btn.inner_text()
-                            except:
-                                pass
-                            if "下载" not in inner_text and "Download" not in inner_text:
-                                self._js_click(page, download_btn)
-                                page.wait_for_timeout(2000)
-                                real_btn = page.query_selector('li:has-text("全量下载"), span:has-text("全量下载"), button:has-text("全量下载")')
-                                if real_btn:
-                                    download_btn = real_btn
-
-                            if download_btn:
-                                logger.info("Success! Starting download...")
-                                with page.expect_download(timeout=120000) as download_info:
-                                    self._js_click(page, download_btn)
-                                download = download_info.value
-                                download_path = os.path.join(settings.OUTPUT_DIR, download.suggested_filename)
-                                download.save_as(download_path)
-                                results_data.append({"file_path": download_path, "type": "file"})
-                                break
-
-                        # 2. Progress feedback
-                        status_area = page.query_selector('.ant-tabs-tabpane-active, .ide-results-area')
-                        status_text = status_area.inner_text() if status_area else ""
-
-                        is_running = any(x in status_text for x in ["查询引擎运行中", "已进行", "查询结果处理中", "处理中", "Executing"]) or \
-                                     bool(page.query_selector('.ant-spin-spinning, .ant-progress-circle, .ant-spin'))
-
-                        if is_running:
-                            elapsed = int(time.time() - start_time)
-                            if elapsed % 15 == 0:
-                                logger.info(f"Feedback: Progressing... [{status_text.strip() if status_text else 'Calculating'}]")
-                            page.wait_for_timeout(3000)
-                            continue
-
-                        # 3. Error detection
-                        error_indicators = ["java.sql.SQLException", "Parse exception", "Error", "mismatched input", "cannot be resolved"]
-                        if any(ind in status_text for ind in error_indicators):
-                            logger.error(f"SQL failed: {status_text.strip()}")
-                            break
-
-                        # 4. Processing lag
-                        if "100%" in status_text or "处理中" in status_text:
-                            page.wait_for_timeout(2000)
-                            continue
-
-                        page.wait_for_timeout(3000)
-
-                        # 5. Idle check
-                        calc_ready = page.query_selector('button:has-text("Calculate"), button:has-text("计算")')
-                        if calc_ready and calc_ready.is_enabled() and not results_data:
-                            result_area = page.query_selector('.ant-tabs-tabpane-active, .ide-results-area, .ant-table-body')
-                            if result_area and ("100%" in status_text or "条结果" in status_text or "Rows" in status_text):
-                                page.wait_for_timeout(5000)
-                                continue
-                            else:
-                                logger.info("IDE idle. No data captured.")
-                                break
+                    with metrics.span("execute", engine="ta"):
+                        self._poll_for_results(page, results_data, timeout)
 
                 except _NeedsFreshLogin:
                     raise  # propagate out of the with-block
                 except Exception as e:
                     logger.error(f"Execution failed: {e}")
+                    failure = e
 
                 context.close()
 
@@ -329,24 +267,514 @@ class ThinkingDataEngine(BaseEngine):
                 sql_text=sql_text,
                 headless=headless,
                 show_window=show_window,
+                timeout=timeout,
                 _retried=_retried,
                 _retried_launch=True,
             )
 
         except _NeedsFreshLogin:
             # Now fully outside sync_playwright context — safe to recurse
-            return self.run_sql_query(sql_text=sql_text, headless=headless, show_window=show_window, _retried=True)
+            return self.run_sql_query(sql_text=sql_text, headless=headless, show_window=show_window, timeout=timeout, _retried=True)
+
+        # Surface the error (after the browser is closed) so callers can retry or record the failure
+        if failure is not None:
+            raise failure
+        return results_data
 
+    def _intercept_results(self, page, results_data):
+        """Capture result JSON the IDE receives, so small results need no file download."""
+        def handle_response(response):
+            try:
+                if response.status == 200 and "json" in response.headers.get("content-type", "").lower():
+                    data = response.json()
+                    payload = data.get("data", data) if isinstance(data, dict) else data
+                    if isinstance(payload, dict):
+                        for key in ["rows", "result", "results", "list"]:
+                            if key in payload and isinstance(payload[key], list) and len(payload[key]) > 0:
+                                if any(k in payload for k in ["header", "columns", "headers"]):
+                                    # Keep the request so the remaining pages can be fetched the same way
+                                    request = response.request
+                                    payload["_request"] = {"url": request.url, "method": request.method,
+                                                           "headers": request.headers, "post_data": request.post_data}
+                                    results_data.append(payload)
+                                    logger.info(f"Intercepted data via key [{key}]: {len(payload[key])} rows.")
+                                    return
+            except:
+                pass
+
+        page.on("response", handle_response)
+        self._interceptors[page] = handle_response
+
+    def _stop_intercepting(self, page):
+        """Detach the result listener so later IDE payloads cannot restart a capture."""
+        handler = self._interceptors.pop(page, None)
+        if handler is not None:
+            try:
+                page.remove_listener("response", handler)
+            except Exception:
+                pass
+
+    def _open_ide(self, page):
+        logger.info(f"Opening IDE page: {self.sql_url}")
+        start = time.perf_counter()
+        with metrics.span("page_ready", engine="ta", profile=self.profile) as span:
+            page.goto(self.sql_url)
+            # Wait for the SPA to finish loading (networkidle = no network requests for 500ms)
+            try:
+                page.wait_for_load_state("networkidle", timeout=30000)
+            except:
+                pass
+            # Wait for login page or editor to appear
+            try:
+                page.wait_for_selector(
+                    ".monaco-editor, .CodeMirror, .ace_editor, textarea, div[class*='content___'], input[type='password']",
+                    timeout=20000
+                )
+            except:
+                pass
+            span["browser_rss"] = child_rss_bytes()
+        rss = f", browser RSS {span['browser_rss'] / 2**20:.0f} MB" if span["browser_rss"] else ""
+        logger.info(f"IDE ready in {time.perf_counter() - start:.1f}s ({self.profile} profile{rss})")
+
+    def _needs_login(self, page):
+        return "login" in page.url.lower() or bool(page.query_selector('input[type="password"]'))
+
+    def warm(self, show_window=False):
+        """
+        Start a browser on the persistent profile and keep it open, so later queries from the
+        same thread open a new tab instead of launching Chromium (used by the serve daemon).
+        """
+        if self._warm_context is not None:
+            return
+        with metrics.span("connect", engine="ta"):
+            self._playwright = sync_playwright().start()
+            try:
+                self._warm_context = self._launch_persistent_context(self._playwright.chromium, headless=False, show_window=show_window)
+            except Exception:
+                self._playwright.stop()
+                self._playwright = None
+                raise
+        logger.info("TA browser session kept warm.")
+
+    def close(self):
+        if self._warm_context is not None:
+            try:
+                self._warm_context.close()
+            except Exception:
+                pass
+            self._warm_context = None
+        if self._playwright is not None:
+            self._playwright.stop()
+            self._playwright = None
+
+    def _run_warm_query(self, page, sql_text, timeout=None):
+        """One query in a new tab of the warm browser; the session (and its login) stays open afterwards."""
+        results_data = []
+        try:
+            self._intercept_results(page, results_data)
+            self._open_ide(page)
+            if self._needs_login(page):
+                logger.info("Session expired. Logging in on the warm browser...")
+                self._perform_login_logic(page)
+                self._open_ide(page)
+            if sql_text:
+                with metrics.span("submit", engine="ta"):
+                    self._submit_sql(page, sql_text)
+            logger.info("Waiting for data (checking engine status)...")
+            with metrics.span("execute", engine="ta"):
+                self._poll_for_results(page, results_data, timeout)
+        except Exception as e:
+            logger.error(f"Execution failed: {e}")
+            raise
+        finally:
+            self._interceptors.pop(page, None)
+            try:
+                page.close()
+            except Exception:
+                pass
         return results_data
 
+    def fetch_many(self, sqls, tabs=None, show_window=False, timeout=None, _retried_launch=False):
+        """
+        Run several SQLs at once, each in its own IDE tab of one browser context, so every tab
+        shares the login and cookie jar. Up to `tabs` (default TA_MAX_TABS) queries run on the
+        TA server concurrently; this thread checks the open tabs in turn and downloads each
+        result as soon as its query finishes. Returns one entry per SQL, in order: the result
+        list, or the exception that query failed with.
+        """
+        if not sqls:
+            return []
+        tabs = max(1, min(tabs or settings.TA_MAX_TABS, len(sqls)))
+
+        if self._warm_context is not None:
+            return self._run_tabs(self._warm_context, sqls, tabs, timeout)
+
+        try:
+            with sync_playwright() as p:
+                try:
+                    with metrics.span("connect", engine="ta"):
+                        context = self._launch_persistent_context(p.chromium, headless=False, show_window=show_window)
+                except Exception as exc:
+                    if _retried_launch:
+                        raise
+                    self._reset_session_after_launch_error(exc)
+                    raise _BrowserLaunchFailed()
+                try:
+                    return self._run_tabs(context, sqls, tabs, timeout)
+                finally:
+                    context.close()
+        except _BrowserLaunchFailed:
+            return self.fetch_many(sqls, tabs=tabs, show_window=show_window, timeout=timeout, _retried_launch=True)
+
+    def _open_tab(self, context, sql_text, results_data):
+        """Open an IDE tab, log in if the shared session expired, and start the query."""
+        page = context.new_page()
+        try:
+            self._intercept_results(page, results_data)
+            self._open_ide(page)
+            if self._needs_login(page):
+                logger.info("Session expired. Logging in once for all tabs...")
+                self._perform_login_logic(page)
+                self._open_ide(page)
+            with metrics.span("submit", engine="ta"):
+                self._submit_sql(page, sql_text)
+        except Exception:
+            self._interceptors.pop(page, None)
+            page.close()
+            raise
+        return page
+
+    def _run_tabs(self, context, sqls, tabs, timeout=None):
+        max_timeout = timeout or 3600
+        outcomes = [None] * len(sqls)
+        waiting = list(enumerate(sqls))
+        active = []
+
+        while waiting or active:
+            # Keep every tab slot busy; the first tab also refreshes the login for the others
+            while waiting and len(active) < tabs:
+                i, sql_text = waiting.pop(0)
+                results_data = []
+                try:
+                    page = self._open_tab(context, sql_text, results_data)
+                except Exception as e:
+                    logger.error(f"Tab {i + 1}/{len(sqls)}: failed to start query: {e}")
+                    outcomes[i] = e
+                    continue
+                logger.info(f"Tab {i + 1}/{len(sqls)}: query started.")
+                active.append({"index": i, "page": page, "results": results_data, "started": time.time(), "next_check": 0})
+
+            for tab in list(active):
+                if tab["next_check"] > time.time():
+                    continue
+                i = tab["index"]
+                try:
+                    if time.time() - tab["started"] >= max_timeout:
+                        raise TimeoutError(f"TA query did not finish within {max_timeout}s")
+                    wait_ms = self._check_results(tab["page"], tab["results"], tab["started"])
+                except Exception as e:
+                    logger.error(f"Tab {i + 1}/{len(sqls)}: execution failed: {e}")
+                    outcomes[i] = e
+                    wait_ms = None
+                if wait_ms is None:
+                    if outcomes[i] is None:
+                        outcomes[i] = tab["results"]
+                    metrics.record("execute", time.time() - tab["started"], engine="ta", tab=i + 1)
+                    logger.info(f"Tab {i + 1}/{len(sqls)}: finished.")
+                    self._interceptors.pop(tab["page"], None)
+                    try:
+                        tab["page"].close()
+                    except Exception:
+                        pass
+                    active.remove(tab)
+                else:
+                    tab["next_check"] = time.time() + wait_ms / 1000
+
+            if active and (not waiting or len(active) >= tabs):
+                delay = min(tab["next_check"] for tab in active) - time.time()
+                if delay > 0:
+                    # Waiting through Playwright keeps response events flowing for every tab
+                    active[0]["page"].wait_for_timeout(delay * 1000)
+        return outcomes
+
+    def _submit_sql(self, page, sql_text):
+        """Inject SQL into the IDE editor and start the calculation."""
+        logger.info("Injecting SQL into editor...")
+        editor_selector = ".monaco-editor, .CodeMirror, .ace_editor, textarea, div[class*='content___'], .tant-monaco-editor"
+        editor = page.wait_for_selector(editor_selector, timeout=30000)
+        self._js_click(page, editor)
+
+        page.keyboard.press("Control+A")
+        page.keyboard.press("Backspace")
+        page.wait_for_timeout(1000)
+
+        # Direct Monaco injection
+        try:
+            success = page.evaluate("""(text) => {
+                if (window.monaco && monaco.editor.getModels().length > 0) {
+                    monaco.editor.getModels()[0].setValue(text);
+                    return true;
+                }
+                return false;
+            }""", sql_text)
+        except:
+            success = False
+
+        if not success:
+            self._js_click(page, editor)
+            page.keyboard.press("Control+A")
+            page.keyboard.press("Backspace")
+            page.keyboard.insert_text(sql_text)
+
+        page.wait_for_timeout(2000)
+
+        # Trigger Calculate — JS click bypasses overlay masks
+        calc_btn = page.query_selector('button:has-text("Calculate"), button:has-text("计算"), .ant-btn:has-text("计算")')
+        if calc_btn:
+            logger.info("Triggering 'Calculate' button...")
+            self._js_click(page, calc_btn)
+        else:
+            logger.info("Triggering Ctrl+Enter...")
+            page.keyboard.press("Control+Enter")
+
+    def _poll_for_results(self, page, results_data, timeout=None):
+        """Wait until the query finishes, downloading the full result or stopping on error/idle."""
+        max_timeout = timeout or 3600
+        start_time = time.time()
+
+        while time.time() - start_time < max_timeout:
+            wait_ms = self._check_results(page, results_data, start_time)
+            if wait_ms is None:
+                break
+            if wait_ms:
+                page.wait_for_timeout(wait_ms)
+        else:
+            if not results_data:
+                raise TimeoutError(f"TA query did not finish within {max_timeout}s")
+
+    def _check_results(self, page, results_data, start_time):
+        """
+        One status check of an IDE tab. Downloads the result once it is ready. Returns the
+        milliseconds to wait before checking again, or None when the tab is finished
+        (result captured, SQL error or idle).
+        """
+        if results_data:
+            if self._capture_all_pages(page, results_data):
+                return None
+            # Too large to page through: fall through to the full download
+
+        # 1. Download button detection
+        download_selectors = [
+            'button:has-text("Download All")', 'button:has-text("全量下载")',
+            '.ant-btn:has-text("全量下载")', 'span:has-text("全量下载")',
+            '.anticon-download', '.anticon-export', '.ide-download-btn'
+        ]
+        download_btn = None
+        for sel in download_selectors:
+            btn = page.query_selector(sel)
+            if btn and btn.is_visible():
+                download_btn = btn
+                break
+
+        if download_btn:
+            inner_text = ""
+            try:
+                inner_text = download_btn.inner_text()
+            except:
+                pass
+            if "下载" not in inner_text and "Download" not in inner_text:
+                self._js_click(page, download_btn)
+                page.wait_for_timeout(2000)
+                real_btn = page.query_selector('li:has-text("全量下载"), span:has-text("全量下载"), button:has-text("全量下载")')
+                if real_btn:
+                    download_btn = real_btn
+
+            if download_btn:
+                logger.info("Success! Starting download...")
+                with metrics.span("download", engine="ta") as span:
+                    with page.expect_download(timeout=120000) as download_info:
+                        self._js_click(page, download_btn)
+                    download = download_info.value
+                    download_path = self._download_path(download.suggested_filename)
+                    download.save_as(download_path)
+                    span["bytes"] = os.path.getsize(download_path)
+                results_data.append({"file_path": download_path, "type": "file"})
+                return None
+
+        # 2. Progress feedback
+        status_area = page.query_selector('.ant-tabs-tabpane-active, .ide-results-area')
+        status_text = status_area.inner_text() if status_area else ""
+
+        is_running = any(x in status_text for x in ["查询引擎运行中", "已进行", "查询结果处理中", "处理中", "Executing"]) or \
+                     bool(page.query_selector('.ant-spin-spinning, .ant-progress-circle, .ant-spin'))
+
+        if is_running:
+            elapsed = int(time.time() - start_time)
+            if elapsed % 15 == 0:
+                logger.info(f"Feedback: Progressing... [{status_text.strip() if status_text else 'Calculating'}]")
+            return 3000
+
+        # 3. Error detection
+        error_indicators = ["java.sql.SQLException", "Parse exception", "Error", "mismatched input", "cannot be resolved"]
+        if any(ind in status_text for ind in error_indicators):
+            logger.error(f"SQL failed: {status_text.strip()}")
+            return None
+
+        # 4. Processing lag
+        if "100%" in status_text or "处理中" in status_text:
+            return 2000
+
+        page.wait_for_timeout(3000)
+
+        # 5. Idle check
+        calc_ready = page.query_selector('button:has-text("Calculate"), button:has-text("计算")')
+        if calc_ready and calc_ready.is_enabled() and not results_data:
+            result_area = page.query_selector('.ant-tabs-tabpane-active, .ide-results-area, .ant-table-body')
+            if result_area and ("100%" in status_text or "条结果" in status_text or "Rows" in status_text):
+                return 5000
+            logger.info("IDE idle. No data captured.")
+            return None
+        return 0
+
+    def _paging(self, request, payload):
+        """
+        How the intercepted result request pages: where the page number (or row offset) and page
+        size live, and the total row count if the response reports one. None if it does not page.
+        """
+        parsed = urlparse(request["url"])
+        params, location = dict(parse_qsl(parsed.query)), "query"
+        try:
+            body = json.loads(request.get("post_data") or "")
+        except ValueError:
+            body = None
+        if isinstance(body, dict) and any(k in body for k in PAGE_KEYS + OFFSET_KEYS):
+            params, location = body, "body"
+
+        page_key = next((k for k in PAGE_KEYS if k in params), None)
+        offset_key = next((k for k in OFFSET_KEYS if k in params), None)
+        if page_key is None and offset_key is None:
+            return None
+        total = next((payload[k] for k in TOTAL_KEYS if isinstance(payload.get(k), int)), None)
+        rows = next(payload[k] for k in ["rows", "result", "results", "list"] if isinstance(payload.get(k), list))
+        if total is not None and total <= len(rows):
+            return None
+        return {
+            "location": location, "params": params, "page_key": page_key, "offset_key": offset_key,
+            "size_key": next((k for k in SIZE_KEYS if k in params), None),
+            "first_page": int(params[page_key]) if page_key else 0, "total": total,
+        }
+
+    def _fetch_page(self, page, request, paging, page_index, offset, size):
+        params = dict(paging["params"])
+        if paging["page_key"]:
+            params[paging["page_key"]] = paging["first_page"] + page_index
+        if paging["offset_key"]:
+            params[paging["offset_key"]] = offset
+        if paging["size_key"]:
+            params[paging["size_key"]] = size
+
+        url, data = request["url"], request.get("post_data")
+        if paging["location"] == "query":
+            url = urlunparse(urlparse(url)._replace(query=urlencode(params)))
+        else:
+            data = json.dumps(params)
+        headers = {k: v for k, v in request["headers"].items() if not k.startswith(":") and k.lower() != "content-length"}
+        # page.request shares the browser context's cookies, so the logged-in session is reused
+        response = page.request.fetch(url, method=request["method"], headers=headers, data=data)
+        if not response.ok:
+            raise RuntimeError(f"result page request failed with HTTP {response.status}")
+        data = response.json()
+        payload = data.get("data", data) if isinstance(data, dict) else data
+        return next((payload[k] for k in ["rows", "result", "results", "list"] if isinstance(payload.get(k), list)), [])
+
+    def _capture_all_pages(self, page, results_data):
+        """
+        Replace an intercepted preview page with the full result, fetched page by page through the
+        same API and streamed into a CSV file, so medium results skip the UI download dialog.
+        Returns False (and clears results_data) if the result is too large for paging.
+        """
+        # Whatever happens below, this tab's capture is decided: stop collecting payloads
+        self._stop_intercepting(page)
+        first = results_data[0]
+        request = first.get("_request") if isinstance(first, dict) else None
+        for item in results_data:
+            if isinstance(item, dict):
+                item.pop("_request", None)
+        max_rows = settings.TA_JSON_CAPTURE_MAX_ROWS
+        if request is None or not max_rows:
+            return True
+        paging = self._paging(request, first)
+        if paging is None:
+            return True
+        if paging["total"] is not None and paging["total"] > max_rows:
+            logger.info(f"Result has {paging['total']} rows (over TA_JSON_CAPTURE_MAX_ROWS); using full download.")
+            results_data.clear()
+            return False
+
+        headers = first.get("header") or first.get("headers") or first.get("columns") or []
+        size = settings.TA_JSON_PAGE_SIZE
+        file_path = self._download_path(f"ta_result_{time.strftime('%Y%m%d_%H%M%S')}.csv")
+        logger.info(f"Fetching all result pages ({paging['total'] or 'unknown'} rows)...")
+        fetched, page_index = 0, 0
+        try:
+            with metrics.span("download", engine="ta", method="json_pages") as span:
+                with open(file_path, "w", newline="", encoding="utf-8-sig") as f:
+                    writer = csv.writer(f)
+                    writer.writerow(headers)
+                    while True:
+                        rows = self._fetch_page(page, request, paging, page_index, fetched, size)
+                        if not rows:
+                            break
+                        writer.writerows([r.get(h) for h in headers] if isinstance(r, dict) else r for r in rows)
+                        if paging["page_key"] and page_index == 0 and len(rows) < size:
+                            # The server capped the page size: number later pages by the size it serves
+                            size = len(rows)
+                        fetched += len(rows)
+                        page_index += 1
+                        if fetched > max_rows:
+                            raise _TooManyRows()
+                        # Without a reported total, read until an empty page (the server may cap the page size)
+                        if paging["total"] is not None and fetched >= paging["total"]:
+                            break
+                span["rows"], span["bytes"] = fetched, os.path.getsize(file_path)
+        except _TooManyRows:
+            os.remove(file_path)
+            logger.info(f"Result exceeds {max_rows} rows; using full download.")
+            results_data.clear()
+            return False
+        except Exception as e:
+            # Keep the preview rather than fail the query; the log says the result is partial
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            logger.warning(f"Paging through the result failed ({e}); keeping the {len(first.get('rows', []))}-row preview.")
+            return True
+
+        logger.info(f"Captured {fetched} rows in {page_index} pages without the download dialog.")
+        results_data[:] = [{"file_path": file_path, "type": "file"}]
+        return True
+
+    def _download_path(self, filename):
+        """Target path for a downloaded result; tabs finishing together may suggest the same name."""
+        path = os.path.join(settings.OUTPUT_DIR, filename)
+        stem, ext = os.path.splitext(path)
+        n = 1
+        while os.path.exists(path):
+            path = f"{stem}_{n}{ext}"
+            n += 1
+        return path
+
     def _perform_login_logic(self, page):
         user_input = page.wait_for_selector('input[placeholder*="Account"], input[placeholder*="Username"], input[placeholder*="账号"], input[id="username"], input[type="text"]', timeout=15000)
         pass_input = page.wait_for_selector('input[placeholder*="Password"], input[placeholder*="密码"], input[id="password"], input[type="password"]', timeout=15000)
         
-        user_input.fill("")
-        user_input.type(self.username, delay=30)
-        pass_input.fill("")
-        pass_input.type(self.password, delay=30)
+        if self.profile == "lean":
+            user_input.fill(self.username)
+            pass_input.fill(self.password)
+        else:
+            user_input.fill("")
+            user_input.type(self.username, delay=30)
+            pass_input.fill("")
+            pass_input.type(self.password, delay=30)
         
         # Try to check "7 days remember me" / "自动登录" / "免登录"
         try:
@@ -0,0 +1,298 @@
+import os
+import json
+import time
+import queue
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from src.config import settings
+from src.utils.cron import CronSchedule
+from src.utils.file_index import get_index
+from src.utils.logger import logger
+
+class TaskDaemon:
+    """
+    Long-running scheduler behind `main.py serve`. Tasks in tasks/configs with a "schedule"
+    (cron expression) are queued when due and run one at a time on a single worker thread,
+    which owns every engine, so ODPS clients, Hologres connections and the TA browser stay
+    warm between runs. Config files are re-read when they change, and a status snapshot
+    (queue depth, running task, next/last runs) is written to DAEMON_STATUS_FILE and,
+    if a port is set, served as JSON on http://127.0.0.1:<port>/.
+
+    runner(task, dependents, engines) runs one task and returns True on success;
+    engine_factory(engine_name, region) creates an engine; group_tasks(tasks) merges
+    tasks that share a query into [(task, dependents)].
+    """
+    def __init__(self, runner, engine_factory, group_tasks, status_file=None, status_port=None, reload_interval=None):
+        self.runner = runner
+        self.engine_factory = engine_factory
+        self.group_tasks = group_tasks
+        self.status_file = status_file or settings.DAEMON_STATUS_FILE
+        self.status_port = settings.DAEMON_STATUS_PORT if status_port is None else status_port
+        self.reload_interval = reload_interval or settings.DAEMON_RELOAD_INTERVAL
+
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._config_mtimes = {}
+        self._config_tasks = {}
+        self._schedules = {}
+        self._next_runs = {}
+        self._active = set()
+        self._running = None
+        self._last_runs = {}
+        self._engines = {}
+        self._started_at = datetime.now()
+        self._http = None
+        self._status_lock = threading.Lock()
+
+    # --- Configs -------------------------------------------------------------------------
+
+    def _parse_config(self, path):
+        with open(path, "r", encoding="utf-8") as f:
+            tasks = json.load(f)
+        entries = {}
+        for i, t in enumerate(tasks if isinstance(tasks, list) else [tasks]):
+            if not t.get("schedule") or t.get("paused", False):
+                continue
+            name = t.get("name", f"{t.get('engine', 'ta')}_export")
+            try:
+                entries[(path, i)] = (t, CronSchedule(t["schedule"]))
+            except ValueError as e:
+                logger.error(f"Invalid schedule for {name} in {os.path.basename(path)}: {e}")
+        return entries
+
+    def reload(self):
+        """Re-read config files that were added, changed or removed since the last check."""
+        index = get_index(settings.CONFIGS_DIR)
+        index.refresh()
+        paths = set(index.files(".json"))
+        changed = False
+        for path in paths:
+            try:
+                mtime = os.stat(path).st_mtime
+            except OSError:
+                continue
+            if self._config_mtimes.get(path) == mtime:
+                continue
+            self._config_mtimes[path] = mtime
+            try:
+                self._config_tasks[path] = self._parse_config(path)
+            except Exception as e:
+                logger.error(f"Failed to load {os.path.relpath(path, settings.CONFIGS_DIR)}: {e}")
+                self._config_tasks[path] = {}
+            changed = True
+        for path in set(self._config_tasks) - paths:
+            del self._config_tasks[path]
+            self._config_mtimes.pop(path, None)
+            changed = True
+
+        if changed:
+            schedules = {}
+            for entries in self._config_tasks.values():
+                schedules.update(entries)
+            with self._lock:
+                self._schedules = schedules
+                self._next_runs = {}
+            logger.info(f"Loaded {len(schedules)} scheduled tasks from {settings.CONFIGS_DIR}")
+        return changed
+
+    # --- Scheduling ----------------------------------------------------------------------
+
+    def _enqueue_due(self, minute):
+        with self._lock:
+            due = [(key, t) for key, (t, cron) in self._schedules.items() if cron.matches(minute)]
+        if not due:
+            return
+        keys_by_task = {}
+        tasks = []
+        for key, t in due:
+            if key in self._active:
+                logger.warning(f"Skipping {t.get('name', 'Unknown')}: previous run still queued or running")
+                continue
+            keys_by_task[id(t)] = key
+            tasks.append(t)
+        for task, deps in self.group_tasks(tasks):
+            keys = [keys_by_task[id(t)] for t in [task, *deps]]
+            with self._lock:
+                self._active.update(keys)
+            self._queue.put((task, deps, keys))
+        logger.info(f"Queued {len(tasks)} due tasks ({minute:%H:%M}); queue depth {self._queue.qsize()}")
+
+    def _worker(self):
+        try:
+            self._warm_up()
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    break
+                self._run_item(*item)
+        finally:
+            # Engines belong to this thread (Playwright's sync API is thread-bound), so close them here
+            for key, engine in self._engines.items():
+                try:
+                    engine.close()
+                except Exception as e:
+                    logger.warning(f"Failed to close {key[0]}/{key[1]} engine: {e}")
+
+    def _engine_keys(self):
+        with self._lock:
+            return sorted({(t.get("engine", "ta"), t.get("region", "global")) for t, _ in self._schedules.values()})
+
+    def _ensure_engine(self, engine_name, region):
+        key = (engine_name, region)
+        if key in self._engines:
+            return
+        try:
+            engine = self.engine_factory(engine_name, region)
+            if engine is None:
+                return
+            engine.warm()
+            self._engines[key] = engine
+            logger.info(f"Warmed {engine_name}/{region} engine")
+        except Exception as e:
+            logger.warning(f"Could not warm {engine_name}/{region} engine: {e}")
+
+    def _warm_up(self):
+        for engine_name, region in self._engine_keys():
+            if self._stop.is_set():
+                return
+            self._ensure_engine(engine_name, region)
+
+    def _run_item(self, task, deps, keys):
+        name = task.get("name", f"{task.get('engine', 'ta')}_export")
+        started = datetime.now()
+        with self._lock:
+            self._running = {"name": name, "started": started.isoformat(timespec="seconds")}
+        self.write_status()
+        # Schedules added by a reload get their engine warmed on first use
+        self._ensure_engine(task.get("engine", "ta"), task.get("region", "global"))
+        start = time.perf_counter()
+        try:
+            ok = bool(self.runner(task, deps, self._engines))
+        except Exception as e:
+            logger.error(f"Scheduled task {name} crashed: {e}")
+            ok = False
+        run = {
+            "started": started.isoformat(timespec="seconds"),
+            "finished": datetime.now().isoformat(timespec="seconds"),
+            "wall_s": round(time.perf_counter() - start, 3),
+            "status": "ok" if ok else "failed",
+        }
+        with self._lock:
+            for t in [task, *deps]:
+                self._last_runs[t.get("name", f"{t.get('engine', 'ta')}_export")] = dict(run, shared_with=name if t is not task else None)
+            self._active.difference_update(keys)
+            self._running = None
+        self.write_status()
+
+    # --- Status --------------------------------------------------------------------------
+
+    def status(self):
+        now = datetime.now()
+        with self._lock:
+            next_runs = self._next_runs
+            schedules = []
+            for key, (t, cron) in sorted(self._schedules.items(), key=lambda kv: (kv[0][0], kv[0][1])):
+                nxt = next_runs.get(key)
+                if nxt is None or nxt <= now:
+                    nxt = next_runs[key] = cron.next_after(now)
+                schedules.append({
+                    "name": t.get("name", f"{t.get('engine', 'ta')}_export"),
+                    "config": os.path.relpath(key[0], settings.CONFIGS_DIR),
+                    "schedule": cron.expr,
+                    "next_run": nxt.isoformat(timespec="minutes") if nxt else None,
+                })
+            return {
+                "pid": os.getpid(),
+                "started": self._started_at.isoformat(timespec="seconds"),
+                "updated": now.isoformat(timespec="seconds"),
+                "queue_depth": self._queue.qsize(),
+                "running": self._running,
+                "warm_engines": [f"{e}/{r}" for e, r in self._engines],
+                "schedules": schedules,
+                "last_runs": dict(self._last_runs),
+            }
+
+    def write_status(self):
+        try:
+            status = self.status()
+            with self._status_lock:
+                os.makedirs(os.path.dirname(os.path.abspath(self.status_file)), exist_ok=True)
+                tmp_path = f"{self.status_file}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(status, f, indent=2, ensure_ascii=False)
+                os.replace(tmp_path, self.status_file)
+        except Exception as e:
+            logger.warning(f"Failed to write daemon status: {e}")
+
+    def _start_http(self):
+        daemon = self
+
+        class StatusHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = json.dumps(daemon.status(), ensure_ascii=False).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._http = ThreadingHTTPServer(("127.0.0.1", self.status_port), StatusHandler)
+        threading.Thread(target=self._http.serve_forever, name="daemon-status", daemon=True).start()
+        logger.info(f"Status endpoint: http://127.0.0.1:{self.status_port}/")
+
+    # --- Main loop -----------------------------------------------------------------------
+
+    def serve_forever(self):
+        self.reload()
+        if self.status_port:
+            self._start_http()
+        worker = threading.Thread(target=self._worker, name="daemon-worker", daemon=True)
+        worker.start()
+        logger.info(f"Scheduler running (status file: {self.status_file}). Press Ctrl+C to stop.")
+
+        # Start one minute back so tasks due in the current minute still fire
+        last_minute = datetime.now().replace(second=0, microsecond=0) - timedelta(minutes=1)
+        last_reload = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                if time.monotonic() - last_reload >= self.reload_interval:
+                    self.reload()
+                    last_reload = time.monotonic()
+                minute = datetime.now().replace(second=0, microsecond=0)
+                if minute > last_minute:
+                    # Catch up on minutes missed while the machine was busy or asleep (at most an hour)
+                    t = max(last_minute + timedelta(minutes=1), minute - timedelta(minutes=59))
+                    while t <= minute:
+                        self._enqueue_due(t)
+                        t += timedelta(minutes=1)
+                    last_minute = minute
+                    self.write_status()
+                self._stop.wait(1)
+        except KeyboardInterrupt:
+            logger.info("Stopping scheduler...")
+        finally:
+            self._stop.set()
+            dropped = 0
+            while True:
+                try:
+                    self._queue.get_nowait()
+                    dropped += 1
+                except queue.Empty:
+                    break
+            if dropped:
+                logger.info(f"Dropped {dropped} queued tasks.")
+            if self._running:
+                logger.info(f"Waiting for {self._running['name']} to finish...")
+            self._queue.put(None)
+            worker.join()
+            if self._http is not None:
+                self._http.shutdown()
+            self.write_status()
+
+    def stop(self):
+        self._stop.set()
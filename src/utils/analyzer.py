@@ -2,6 +2,7 @@ import csv
 import os
 import time
 from src.utils.logger import logger
+from src.utils.compressed_io import open_text
 
 class LogAnalyzer:
     """
@@ -15,7 +16,7 @@ class LogAnalyzer:
     @staticmethod
     def analyze_csv(csv_path, target_ids):
         """
-        Analyzes a CSV file and returns a structured report of ID occurrences.
+        Analyzes a CSV file (plain, .gz or .zst) and returns a structured report of ID occurrences.
         """
         if not os.path.exists(csv_path):
             raise FileNotFoundError(f"CSV file not found: {csv_path}")
@@ -28,8 +29,8 @@ class LogAnalyzer:
         row_count = 0
         
         try:
-            # Use utf-8-sig to handle potential BOM
-            with open(csv_path, 'r', encoding='utf-8-sig') as f:
+            # Use utf-8-sig to handle potential BOM; .csv.gz/.csv.zst are decompressed while reading
+            with open_text(csv_path, encoding='utf-8-sig') as f:
                 reader = csv.reader(f)
                 header = next(reader)
                 
@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+from src.config import settings
+from src.utils.logger import logger
+from src.utils.metrics import metrics, peak_rss_bytes, current_rss_bytes
+from src.utils.exporter import is_arrow_table
+
+def _arrow_string_dtype():
+    try:
+        import pyarrow as pa
+    except ImportError:
+        logger.warning("Module 'pyarrow' not found; keeping object strings for high-cardinality columns.")
+        return None
+    return pd.ArrowDtype(pa.string())
+
+def _is_low_cardinality(n_unique, n_rows, threshold):
+    return n_rows > 0 and n_unique / n_rows <= threshold
+
+def _downcast_float(col):
+    """float32 only when every value survives the round trip (revenue totals must stay exact)."""
+    small = col.astype("float32")
+    if ((small.astype("float64") == col) | col.isna()).all():
+        return small
+    return col
+
+def compact_frame(df, categorical_threshold=None, arrow_strings=True):
+    """
+    Copy of a DataFrame with smaller dtypes: string columns with few distinct values
+    become categoricals, other strings become Arrow-backed strings, integers take the smallest
+    type that fits and floats become float32 when that is lossless.
+    """
+    threshold = settings.COMPACT_CATEGORICAL_THRESHOLD if categorical_threshold is None else categorical_threshold
+    string_dtype = _arrow_string_dtype() if arrow_strings else None
+    out = {}
+    for name, col in df.items():
+        if pd.api.types.is_object_dtype(col) or pd.api.types.is_string_dtype(col):
+            if pd.api.types.is_object_dtype(col) and not pd.api.types.is_string_dtype(col.dropna().infer_objects()):
+                # Mixed objects (dicts, lists, bytes) are left alone
+                out[name] = col
+            elif _is_low_cardinality(col.nunique(dropna=True), len(col), threshold):
+                out[name] = col.astype("category")
+            elif string_dtype is not None:
+                out[name] = col.astype(string_dtype)
+            else:
+                out[name] = col
+        elif pd.api.types.is_bool_dtype(col):
+            out[name] = col
+        elif pd.api.types.is_integer_dtype(col) and not isinstance(col.dtype, pd.ArrowDtype):
+            values = col.dropna()
+            if values.empty:
+                # Nothing to size the type by (an all-NA nullable column)
+                out[name] = col
+            else:
+                out[name] = pd.to_numeric(col, downcast="unsigned" if values.min() >= 0 else "integer")
+        elif pd.api.types.is_float_dtype(col) and col.dtype == "float64":
+            out[name] = _downcast_float(col)
+        else:
+            out[name] = col
+    return pd.DataFrame(out, index=df.index)
+
+def compact_arrow(table, categorical_threshold=None):
+    """Dictionary-encode low-cardinality string columns and narrow integer columns of a pyarrow Table."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    threshold = settings.COMPACT_CATEGORICAL_THRESHOLD if categorical_threshold is None else categorical_threshold
+    columns = []
+    for col in table.columns:
+        if pa.types.is_string(col.type) or pa.types.is_large_string(col.type):
+            if _is_low_cardinality(pc.count_distinct(col).as_py(), len(col), threshold):
+                col = col.dictionary_encode()
+        elif pa.types.is_integer(col.type) and len(col) > 0:
+            bounds = pc.min_max(col)
+            lo, hi = bounds["min"].as_py(), bounds["max"].as_py()
+            if lo is not None:
+                candidates = [pa.uint8(), pa.uint16(), pa.uint32()] if lo >= 0 else [pa.int8(), pa.int16(), pa.int32()]
+                for target in candidates:
+                    info = np.iinfo(target.to_pandas_dtype())
+                    if target.bit_width < col.type.bit_width and info.min <= lo and hi <= info.max:
+                        col = col.cast(target)
+                        break
+        columns.append(col)
+    return pa.table(columns, names=table.column_names)
+
+def _nbytes(results):
+    if is_arrow_table(results):
+        return results.nbytes
+    return int(results.memory_usage(index=True, deep=True).sum())
+
+def compact_results(results, categorical_threshold=None, arrow_strings=True):
+    """
+    Compact a fetched DataFrame or Arrow table and log its size and the current process RSS
+    before and after (plus the lifetime peak, which never goes down). Other result types
+    (TA JSON payloads) are returned unchanged.
+    """
+    if not isinstance(results, pd.DataFrame) and not is_arrow_table(results):
+        return results
+    before, rss_before = _nbytes(results), current_rss_bytes()
+    with metrics.span("compact", rows=len(results)) as span:
+        if is_arrow_table(results):
+            results = compact_arrow(results, categorical_threshold)
+        else:
+            results = compact_frame(results, categorical_threshold, arrow_strings)
+        after = _nbytes(results)
+        span["bytes"], span["bytes_before"] = after, before
+    rss, peak = current_rss_bytes(), peak_rss_bytes()
+    memory = []
+    if rss_before and rss:
+        # The caller still holds the original until it rebinds the result, so RSS drops only after that
+        memory.append(f"current RSS {rss_before / 2**20:.0f} MB -> {rss / 2**20:.0f} MB")
+    if peak:
+        memory.append(f"process peak RSS {peak / 2**20:.0f} MB")
+    logger.info(f"Compacted result: {before / 2**20:.1f} MB -> {after / 2**20:.1f} MB"
+                + (f" ({'; '.join(memory)})" if memory else ""))
+    return results
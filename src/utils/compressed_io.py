@@ -0,0 +1,194 @@
+import io
+import os
+import gzip
+import queue
+import threading
+from src.config import settings
+from src.utils.logger import logger
+
+# File names the log tools accept: plain CSV, CSV compressed with gzip or zstd, and archived
+# TA dumps saved as bare .zst (zstd-compressed CSV without .csv in the name)
+CSV_EXTENSIONS = ('.csv', '.csv.gz', '.csv.zst', '.csv.zstd', '.zst', '.zstd')
+# Compression levels for written files (gzip 1-9, zstd 1-22)
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+def compression_of(path):
+    """'gzip', 'zstd' or None, from the file extension."""
+    name = path.lower()
+    if name.endswith('.gz'):
+        return 'gzip'
+    if name.endswith(('.zst', '.zstd')):
+        return 'zstd'
+    return None
+
+class _PrefetchReader(io.RawIOBase):
+    """
+    Reads a (decompressing) binary stream on a background thread, a few blocks ahead of the
+    consumer. zlib and zstd release the GIL while decompressing, so decompression runs on a
+    second core in parallel with CSV parsing, without writing anything to disk.
+    """
+    _EOF = object()
+
+    def __init__(self, raw, block_size=1 << 20, depth=8):
+        self._raw = raw
+        self._block_size = block_size
+        self._queue = queue.Queue(maxsize=depth)
+        self._stop = threading.Event()
+        self._pending = b""
+        self._done = False
+        self._thread = threading.Thread(target=self._fill, name="decompress-prefetch", daemon=True)
+        self._thread.start()
+
+    def _fill(self):
+        try:
+            while not self._stop.is_set():
+                block = self._raw.read(self._block_size)
+                if not block:
+                    break
+                self._put(block)
+        except Exception as e:
+            self._put(e)
+        finally:
+            self._put(self._EOF)
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=1)
+                return
+            except queue.Full:
+                pass
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if not self._pending and not self._done:
+            item = self._queue.get()
+            if item is self._EOF:
+                self._done = True
+            elif isinstance(item, Exception):
+                self._done = True
+                raise item
+            else:
+                self._pending = item
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+    def close(self):
+        if not self.closed:
+            self._stop.set()
+            self._thread.join()
+            self._raw.close()
+        super().close()
+
+class _BackgroundWriter(io.RawIOBase):
+    """
+    Hands written blocks to a background thread that feeds the (compressing) binary stream, so
+    zlib compression, which releases the GIL, overlaps with formatting the CSV text.
+    """
+    _EOF = object()
+
+    def __init__(self, raw, depth=8):
+        self._raw = raw
+        self._queue = queue.Queue(maxsize=depth)
+        self._error = None
+        self._thread = threading.Thread(target=self._drain, name="compress-writer", daemon=True)
+        self._thread.start()
+
+    def _drain(self):
+        while True:
+            block = self._queue.get()
+            if block is self._EOF:
+                return
+            if self._error is None:
+                try:
+                    self._raw.write(block)
+                except Exception as e:
+                    self._error = e
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        if self._error is not None:
+            raise self._error
+        self._queue.put(bytes(b))
+        return len(b)
+
+    def close(self):
+        if not self.closed:
+            self._queue.put(self._EOF)
+            self._thread.join()
+            self._raw.close()
+            super().close()
+            if self._error is not None:
+                raise self._error
+
+def _open_gzip(path, threads):
+    try:
+        import pgzip
+    except ImportError:
+        return gzip.open(path, 'rb')
+    # pgzip decompresses blocks on several threads (fastest on files written by pgzip)
+    return pgzip.open(path, 'rb', thread=threads)
+
+def _open_zstd(path):
+    try:
+        import zstandard
+    except ImportError:
+        logger.error("Module 'zstandard' not found. Please install zstandard to read .zst files.")
+        raise
+    f = open(path, 'rb')
+    return zstandard.ZstdDecompressor().stream_reader(f, closefd=True)
+
+def _threads(threads=None):
+    threads = settings.EXPORT_COMPRESS_THREADS if threads is None else threads
+    return threads if threads > 0 else (os.cpu_count() or 1)
+
+def open_binary_writer(path, threads=None):
+    """
+    Open a binary file for writing, compressed by its extension: .gz with pgzip's parallel block
+    compression when installed (stdlib gzip on a background thread otherwise), .zst with
+    multi-threaded zstd. Other extensions are written as is.
+    """
+    kind = compression_of(path)
+    if kind is None:
+        return open(path, 'wb')
+    threads = _threads(threads)
+    if kind == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            logger.error("Module 'zstandard' not found. Please install zstandard to write .zst files.")
+            raise
+        cctx = zstandard.ZstdCompressor(level=ZSTD_LEVEL, threads=threads if threads > 1 else 0)
+        return io.BufferedWriter(cctx.stream_writer(open(path, 'wb'), closefd=True), buffer_size=1 << 20)
+    try:
+        import pgzip
+    except ImportError:
+        return io.BufferedWriter(_BackgroundWriter(gzip.open(path, 'wb', compresslevel=GZIP_LEVEL)), buffer_size=1 << 20)
+    return pgzip.open(path, 'wb', thread=threads, compresslevel=GZIP_LEVEL)
+
+def open_text_writer(path, encoding='utf-8-sig', threads=None):
+    """Text counterpart of open_binary_writer (newline='' for csv); utf-8-sig writes the BOM once, at the start."""
+    if compression_of(path) is None:
+        return open(path, 'w', encoding=encoding, newline='')
+    return io.TextIOWrapper(open_binary_writer(path, threads), encoding=encoding, newline='')
+
+def open_text(path, encoding='utf-8-sig', prefetch=True, threads=None):
+    """
+    Open a plain, gzip or zstd compressed text file for streaming reads (newline='' for csv).
+    Compressed files are decompressed on the fly, a few MB ahead of the reader.
+    """
+    kind = compression_of(path)
+    if kind is None:
+        return open(path, 'r', encoding=encoding, newline='')
+    threads = threads or os.cpu_count() or 1
+    raw = _open_gzip(path, threads) if kind == 'gzip' else _open_zstd(path)
+    if prefetch:
+        raw = io.BufferedReader(_PrefetchReader(raw), buffer_size=1 << 20)
+    return io.TextIOWrapper(raw, encoding=encoding, newline='')
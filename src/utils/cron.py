@@ -0,0 +1,82 @@
+from datetime import timedelta
+
+ALIASES = {
+    "@hourly": "0 * * * *",
+    "@daily": "0 0 * * *",
+    "@weekly": "0 0 * * 0",
+    "@monthly": "0 0 1 * *",
+}
+
+# (min, max) per field: minute, hour, day of month, month, day of week (0 = Sunday, 7 also accepted)
+_FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+def _parse_field(field, lo, hi):
+    values = set()
+    for part in field.split(","):
+        step = 1
+        if "/" in part:
+            part, step_str = part.split("/", 1)
+            step = int(step_str)
+            if step < 1:
+                raise ValueError(f"invalid step in '{field}'")
+        if part in ("*", ""):
+            start, end = lo, hi
+        elif "-" in part:
+            start, end = (int(x) for x in part.split("-", 1))
+        else:
+            start = int(part)
+            end = hi if step > 1 else start
+        if start < lo or end > hi or start > end:
+            raise ValueError(f"'{field}' is out of range {lo}-{hi}")
+        values.update(range(start, end + 1, step))
+    return values
+
+class CronSchedule:
+    """
+    Standard 5-field cron expression ("minute hour day-of-month month day-of-week") with
+    *, lists, ranges and steps, plus @hourly/@daily/@weekly/@monthly. As in cron, when both
+    day fields are restricted a day matches if either one does.
+    """
+    def __init__(self, expr):
+        self.expr = expr.strip()
+        fields = ALIASES.get(self.expr, self.expr).split()
+        if len(fields) != 5:
+            raise ValueError(f"cron expression needs 5 fields: '{expr}'")
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            _parse_field(f, lo, hi) for f, (lo, hi) in zip(fields, _FIELD_RANGES)
+        )
+        self.weekdays = {d % 7 for d in weekdays}
+        self._any_day = fields[2] == "*"
+        self._any_weekday = fields[4] == "*"
+
+    def _day_matches(self, dt):
+        day_ok = dt.day in self.days
+        # Python: Monday = 0; cron: Sunday = 0
+        weekday_ok = (dt.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def matches(self, dt):
+        return (dt.minute in self.minutes and dt.hour in self.hours
+                and dt.month in self.months and self._day_matches(dt))
+
+    def next_after(self, dt):
+        """First matching minute strictly after dt (searches up to about one year ahead)."""
+        t = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=366)
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+            elif t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+            elif t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+            else:
+                return t
+        return None
+
+    def __repr__(self):
+        return f"CronSchedule({self.expr!r})"
@@ -1,16 +1,80 @@
 import pandas as pd
 import os
+from collections.abc import Iterator
 from datetime import datetime
 from src.utils.logger import logger
+from src.utils.metrics import metrics
+from src.utils.compressed_io import open_binary_writer, open_text_writer
 from src.config import settings
 
+# Excel worksheets hold 1,048,576 rows including the header
+XLSX_MAX_ROWS = 1048575
+# Delimited text formats; each can also be written compressed, e.g. csv.gz or tsv.zst
+TEXT_FORMATS = ["csv", "txt", "tsv"]
+COMPRESSED_TEXT_FORMATS = [f"{fmt}.{ext}" for fmt in TEXT_FORMATS for ext in ("gz", "zst")]
+EXPORT_FORMATS = ["xlsx", "json", "parquet"] + TEXT_FORMATS + COMPRESSED_TEXT_FORMATS
+# Formats export_chunks can write one chunk at a time
+STREAMING_FORMATS = ["parquet"] + TEXT_FORMATS + COMPRESSED_TEXT_FORMATS
+
+def is_arrow_table(results):
+    """True for a pyarrow Table, checked without importing pyarrow."""
+    return type(results).__module__.startswith("pyarrow") and hasattr(results, "num_rows")
+
+def _separator(fmt):
+    return "," if fmt.split(".")[0] == "csv" else "\t"
+
+def _write_arrow_csv(table, filepath, sep=","):
+    """Write a pyarrow Table as CSV/TSV with the same UTF-8 BOM as the pandas path, without converting to pandas."""
+    import pyarrow.csv as pacsv
+    with open_binary_writer(filepath) as f:
+        f.write('\ufeff'.encode('utf-8'))
+        pacsv.write_csv(table, f, write_options=pacsv.WriteOptions(delimiter=sep))
+
+def _write_parquet(df, table, filepath):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        logger.error("Module 'pyarrow' not found. Please install pyarrow for parquet export.")
+        raise
+    if table is None:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    pq.write_table(table, filepath)
+
+def _promote_null_fields(schema):
+    """
+    A streamed parquet file keeps the schema of its first chunk, so a column that is all NULL
+    there (typed null) is widened to large_string. Returns (schema, names of widened columns).
+    """
+    import pyarrow as pa
+    promoted = []
+    for i, field in enumerate(schema):
+        if pa.types.is_null(field.type):
+            schema = schema.set(i, field.with_type(pa.large_string()))
+            promoted.append(field.name)
+    return schema, promoted
+
+def _as_text(chunk, columns):
+    """Later chunks of a widened column are written as text to match the file schema."""
+    if not columns:
+        return chunk
+    chunk = chunk.copy()
+    for col in columns:
+        chunk[col] = chunk[col].astype("string")
+    return chunk
+
 def export_data(results, filename_prefix="data_export", formats=["xlsx"], output_dir=None):
     """
-    Export results to multiple formats (xlsx, csv, json).
+    Export results to multiple formats (xlsx, csv, json, txt, parquet, csv.gz, csv.zst, ...).
+    Accepts a DataFrame, TA intercepted JSON, or a pyarrow Table; Arrow tables are written
+    to csv/txt/parquet directly and only converted to pandas for xlsx/json. An iterator of
+    DataFrame chunks is handed to export_chunks.
     Returns a list of generated file paths.
     """
     if results is None:
         return []
+    if isinstance(results, Iterator):
+        return export_chunks(results, filename_prefix, formats, output_dir)[0]
 
     # Use default export dir from settings if not specified
     if output_dir is None:
@@ -21,8 +85,11 @@ def export_data(results, filename_prefix="data_export", formats=["xlsx"], output
 
     # 1. Prepare DataFrame
     df = None
+    table = None
     if isinstance(results, pd.DataFrame):
         df = results
+    elif is_arrow_table(results):
+        table = results
     elif isinstance(results, list):
         # Check if it's the TA format (intercepted JSON)
         if results and isinstance(results[-1], dict):
@@ -32,9 +99,10 @@ def export_data(results, filename_prefix="data_export", formats=["xlsx"], output
             if rows:
                 df = pd.DataFrame(rows, columns=headers)
     
-    if df is None:
+    if df is None and table is None:
         logger.warning("No data available to export.")
         return []
+    row_count = len(df) if df is not None else table.num_rows
 
     # 2. Export to each requested format
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -44,18 +112,32 @@ def export_data(results, filename_prefix="data_export", formats=["xlsx"], output
         fmt = fmt.lower().strip()
         filepath = os.path.join(output_dir, f"{filename_prefix}_{timestamp}.{fmt}")
         
+        if fmt not in EXPORT_FORMATS:
+            logger.error(f"Unsupported format: {fmt}")
+            continue
+
+        if fmt == "xlsx" and row_count > XLSX_MAX_ROWS:
+            logger.error(f"xlsx holds at most {XLSX_MAX_ROWS:,} rows; the result has {row_count:,}. Use parquet or csv.")
+            continue
+
         try:
-            if fmt == "xlsx":
-                df.to_excel(filepath, index=False)
-            elif fmt == "csv":
-                df.to_csv(filepath, index=False, encoding='utf-8-sig')
-            elif fmt == "json":
-                df.to_json(filepath, orient='records', force_ascii=False, indent=4)
-            elif fmt in ["txt", "tsv"]:
-                df.to_csv(filepath, sep='\t', index=False, encoding='utf-8-sig')
-            else:
-                logger.error(f"Unsupported format: {fmt}")
-                continue
+            with metrics.span("export", format=fmt, rows=row_count) as span:
+                if fmt == "parquet":
+                    _write_parquet(df, table, filepath)
+                elif table is not None and fmt not in ["xlsx", "json"]:
+                    _write_arrow_csv(table, filepath, sep=_separator(fmt))
+                else:
+                    if df is None:
+                        # xlsx/json need pandas: convert the Arrow table once and reuse it
+                        df = table.to_pandas()
+                    if fmt == "xlsx":
+                        df.to_excel(filepath, index=False)
+                    elif fmt == "json":
+                        df.to_json(filepath, orient='records', force_ascii=False, indent=4)
+                    else:
+                        with open_text_writer(filepath) as f:
+                            df.to_csv(f, sep=_separator(fmt), index=False)
+                span["bytes"] = os.path.getsize(filepath)
                 
             logger.info(f"Data successfully exported to: {filepath}")
             file_paths.append(filepath)
@@ -63,3 +145,81 @@ def export_data(results, filename_prefix="data_export", formats=["xlsx"], output
             logger.error(f"Export to {fmt} failed: {e}")
 
     return file_paths
+
+def export_chunks(chunks, filename_prefix="data_export", formats=["parquet"], output_dir=None):
+    """
+    Export an iterator of DataFrame chunks without holding the whole result: parquet through
+    a ParquetWriter row group per chunk, csv/txt/tsv (plain or .gz/.zst) appended to one open
+    stream with a single header and BOM. Formats that need the full frame (xlsx, json) are
+    skipped. Returns (list of file paths, total rows); raises RuntimeError when none of the
+    requested formats could be written.
+    """
+    if output_dir is None:
+        output_dir = settings.EXPORT_DIR
+    os.makedirs(output_dir, exist_ok=True)
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    targets = {}
+    for fmt in formats:
+        fmt = fmt.lower().strip()
+        if fmt not in STREAMING_FORMATS:
+            logger.warning(f"Format {fmt} cannot be written chunk by chunk; skipped for this streamed result.")
+            continue
+        targets[fmt] = os.path.join(output_dir, f"{filename_prefix}_{timestamp}.{fmt}")
+    if "parquet" in targets:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            logger.error("Module 'pyarrow' not found. Please install pyarrow for parquet export.")
+            raise
+
+    # ParquetWriters and open text streams, created on the first chunk
+    writers, failed, rows, text_columns, complete = {}, set(), 0, [], False
+    with metrics.span("export", format="+".join(targets), mode="stream") as span:
+        try:
+            for chunk in chunks:
+                for fmt, filepath in targets.items():
+                    if fmt in failed:
+                        continue
+                    try:
+                        if fmt == "parquet":
+                            if fmt not in writers:
+                                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                                schema, text_columns = _promote_null_fields(table.schema)
+                                writers[fmt] = pq.ParquetWriter(filepath, schema)
+                                table = table.cast(schema)
+                            else:
+                                table = pa.Table.from_pandas(_as_text(chunk, text_columns), schema=writers[fmt].schema,
+                                                             preserve_index=False)
+                            writers[fmt].write_table(table)
+                        else:
+                            first = fmt not in writers
+                            if first:
+                                writers[fmt] = open_text_writer(filepath)
+                            chunk.to_csv(writers[fmt], sep=_separator(fmt), index=False, header=first)
+                    except Exception as e:
+                        logger.error(f"Export to {fmt} failed: {e}")
+                        failed.add(fmt)
+                rows += len(chunk)
+                logger.info(f"Exported {rows:,} rows...")
+            complete = True
+        finally:
+            for fmt, writer in writers.items():
+                try:
+                    writer.close()
+                except Exception as e:
+                    logger.error(f"Export to {fmt} failed: {e}")
+                    failed.add(fmt)
+            # A failed format, or every format when the fetch broke off, leaves a truncated file; never deliver it
+            for fmt, filepath in targets.items():
+                if (fmt in failed or not complete) and os.path.exists(filepath):
+                    os.remove(filepath)
+        paths = [p for fmt, p in targets.items() if fmt not in failed and os.path.exists(p)]
+        span["rows"], span["bytes"] = rows, sum(os.path.getsize(p) for p in paths)
+
+    if not targets or (failed and not paths):
+        raise RuntimeError(f"Streamed export wrote none of the requested formats ({', '.join(formats)}).")
+    for p in paths:
+        logger.info(f"Data successfully exported to: {p}")
+    return paths, rows
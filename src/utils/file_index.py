@@ -0,0 +1,136 @@
+import os
+import json
+import hashlib
+import threading
+from src.config import settings
+from src.utils.logger import logger
+
+class FileIndex:
+    """
+    Name -> path index of a directory tree, so task and SQL names resolve with a dict lookup
+    instead of an os.walk per task. The index is cached on disk under CACHE_DIR together with
+    the mtime of every indexed directory; adding, removing or renaming a file changes its
+    directory's mtime, so a changed tree is detected with one stat per directory.
+    """
+    def __init__(self, root, recursive=True):
+        self.root = os.path.abspath(root)
+        self.recursive = recursive
+        key = hashlib.sha1(f"{self.root}|{recursive}".encode("utf-8")).hexdigest()[:16]
+        self.cache_path = os.path.join(settings.CACHE_DIR, f"file_index_{key}.json")
+        self._files = {}
+        self._dir_mtimes = {}
+        self._warned = set()
+        self._lock = threading.Lock()
+        self._load()
+
+    def _scan(self):
+        files, dir_mtimes = {}, {}
+        if os.path.isdir(self.root):
+            for root, dirs, names in os.walk(self.root):
+                dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+                dir_mtimes[root] = os.stat(root).st_mtime
+                for name in names:
+                    files.setdefault(name, []).append(os.path.join(root, name))
+                if not self.recursive:
+                    break
+        # Shallowest first, the same file os.walk used to find first
+        for paths in files.values():
+            paths.sort(key=lambda p: (p.count(os.sep), p))
+        return files, dir_mtimes
+
+    def _stale(self):
+        if not self._dir_mtimes:
+            return True
+        for path, mtime in self._dir_mtimes.items():
+            try:
+                if os.stat(path).st_mtime != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def _load(self):
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            self._files, self._dir_mtimes = cached["files"], cached["dirs"]
+        except (OSError, ValueError, KeyError):
+            self._files, self._dir_mtimes = {}, {}
+        if self._stale():
+            self.rebuild()
+
+    def rebuild(self):
+        self._files, self._dir_mtimes = self._scan()
+        try:
+            os.makedirs(settings.CACHE_DIR, exist_ok=True)
+            tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"root": self.root, "files": self._files, "dirs": self._dir_mtimes}, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f"Failed to write file index cache: {e}")
+
+    def refresh(self):
+        """Re-validate against directory mtimes and rebuild if anything changed."""
+        with self._lock:
+            if self._stale():
+                self.rebuild()
+
+    def _match(self, name):
+        candidates = self._files.get(os.path.basename(name), [])
+        if os.path.basename(name) != name:
+            # Relative names like "adhoc/report.sql" only match paths ending with them
+            suffix = os.sep + os.path.normpath(name)
+            candidates = [p for p in candidates if p.endswith(suffix)]
+        return candidates
+
+    def resolve(self, name):
+        """Path of the file called `name` (a file name or a path relative to the root), or None."""
+        if not name:
+            return None
+        direct = os.path.join(self.root, name)
+        if os.path.isfile(direct):
+            return direct
+
+        candidates = self._match(name)
+        if not candidates or not os.path.exists(candidates[0]):
+            # Unknown or deleted since indexing: the tree may have changed
+            self.refresh()
+            candidates = self._match(name)
+        if not candidates:
+            return None
+        if len(candidates) > 1 and name not in self._warned:
+            self._warned.add(name)
+            others = ", ".join(os.path.relpath(p, self.root) for p in candidates[1:])
+            logger.warning(f"Ambiguous name '{name}' matches {len(candidates)} files under {self.root}; "
+                           f"using {os.path.relpath(candidates[0], self.root)} (also: {others})")
+        return candidates[0]
+
+    def files(self, suffix=""):
+        """Every indexed path whose name ends with `suffix`."""
+        return sorted(p for name, paths in self._files.items() if name.endswith(suffix) for p in paths)
+
+    def duplicates(self):
+        """{name: [paths]} for every file name that occurs more than once in the tree."""
+        return {name: paths for name, paths in self._files.items() if len(paths) > 1}
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_index(root, recursive=True):
+    """Process-wide FileIndex for a directory, built (or loaded from the disk cache) on first use."""
+    key = (os.path.abspath(root), recursive)
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = FileIndex(root, recursive=recursive)
+        return _indexes[key]
+
+def find_file(name, roots, recursive=True):
+    """Resolve `name` as-is, then in each root directory in order. Returns the first path found or None."""
+    if name and os.path.isfile(name):
+        return name
+    for root in roots:
+        path = get_index(root, recursive=recursive).resolve(name)
+        if path:
+            return path
+    return None
@@ -0,0 +1,74 @@
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime
+from src.config import settings
+from src.utils.logger import logger
+
+def task_fingerprint(task_config, sql_content):
+    """Hash of everything that decides a task's output: its config and the resolved SQL text."""
+    payload = json.dumps({"task": task_config, "sql": sql_content}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+class RunJournal:
+    """
+    Per-config record of a batch run: status, output files, attempts and input fingerprint of
+    every task, rewritten atomically after each change under JOURNAL_DIR/<config>.json.
+    `fetch --task ... --resume` loads it and reruns only the tasks that did not finish, whose
+    inputs changed, or whose output files are gone.
+    """
+    def __init__(self, config_path, resume=False):
+        name = os.path.splitext(os.path.basename(config_path))[0]
+        self.path = os.path.join(settings.JOURNAL_DIR, f"{name}.json")
+        self._lock = threading.Lock()
+        self.tasks = {}
+        if resume:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.tasks = json.load(f).get("tasks", {})
+            except FileNotFoundError:
+                logger.info(f"No journal at {self.path}; running every task.")
+            except ValueError as e:
+                logger.warning(f"Unreadable journal {self.path} ({e}); running every task.")
+        self.config_path = config_path
+
+    def is_done(self, name, fingerprint):
+        entry = self.tasks.get(name)
+        if not entry or entry.get("status") != "ok" or entry.get("fingerprint") != fingerprint:
+            return False
+        files = entry.get("files") or []
+        return bool(files) and all(os.path.exists(p) and os.path.getsize(p) > 0 for p in files)
+
+    def start(self, name, fingerprint):
+        """Mark one attempt of a task as running (attempts restart when the inputs changed)."""
+        with self._lock:
+            entry = self.tasks.setdefault(name, {})
+            attempts = entry.get("attempts", 0) if entry.get("fingerprint") == fingerprint else 0
+            entry.update(status="running", fingerprint=fingerprint, attempts=attempts + 1,
+                         started=datetime.now().isoformat(timespec="seconds"))
+            self._save()
+
+    def finish(self, name, status, files=None, error=None):
+        with self._lock:
+            entry = self.tasks.setdefault(name, {})
+            entry.update(status=status, files=list(files or []), error=error,
+                         finished=datetime.now().isoformat(timespec="seconds"))
+            self._save()
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"config": self.config_path, "updated": datetime.now().isoformat(timespec="seconds"),
+                           "tasks": self.tasks}, f, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Failed to write run journal: {e}")
+
+    def summary(self):
+        counts = {}
+        for entry in self.tasks.values():
+            counts[entry.get("status")] = counts.get(entry.get("status"), 0) + 1
+        return counts
@@ -0,0 +1,95 @@
+import os
+import re
+import glob
+import pandas as pd
+from src.config import settings
+from src.utils.logger import logger
+from src.utils.metrics import metrics, frame_nbytes
+from src.utils.exporter import is_arrow_table
+
+def table_name(name):
+    """SQL-safe table name for a task or file name: lowercase letters, digits and underscores."""
+    name = re.sub(r"[^0-9a-zA-Z_]+", "_", str(name)).strip("_").lower()
+    return f"t_{name}" if not name or name[0].isdigit() else name
+
+def _to_frame(results):
+    if isinstance(results, pd.DataFrame):
+        return results
+    if isinstance(results, list) and results and isinstance(results[-1], dict):
+        # TA intercepted JSON
+        last_item = results[-1]
+        headers = last_item.get("header", []) or last_item.get("headers", [])
+        rows = last_item.get("rows", []) or last_item.get("results", [])
+        if rows:
+            return pd.DataFrame(rows, columns=headers)
+    return None
+
+class LocalDB:
+    """
+    Local analytical copy of fetched results: each registered result is one Parquet file under
+    LOCAL_DB_DIR, and `query` runs DuckDB SQL over all of them. Incremental partition stores are
+    exposed as well, as store_<task>. Slicing a big result again is then a local scan instead
+    of another warehouse query.
+    """
+    def __init__(self, root=None):
+        self.root = root or settings.LOCAL_DB_DIR
+
+    def tables(self):
+        """{table name: parquet path or glob}, registered results first, then partition stores."""
+        tables = {}
+        if os.path.isdir(self.root):
+            for f in sorted(os.listdir(self.root)):
+                if f.endswith(".parquet"):
+                    tables[f[:-len(".parquet")]] = os.path.join(self.root, f)
+        if os.path.isdir(settings.STORE_DIR):
+            for name in sorted(os.listdir(settings.STORE_DIR)):
+                parts = os.path.join(settings.STORE_DIR, name, "*", "part.parquet")
+                if glob.glob(parts):
+                    tables.setdefault(f"store_{table_name(name)}", parts)
+        return tables
+
+    def register(self, name, results):
+        """Write a fetched result (DataFrame, Arrow table or TA JSON) as table `name`. Returns the table name."""
+        table = table_name(name)
+        os.makedirs(self.root, exist_ok=True)
+        target = os.path.join(self.root, f"{table}.parquet")
+        tmp_path = f"{target}.tmp"
+        with metrics.span("register", table=table) as span:
+            if is_arrow_table(results):
+                import pyarrow.parquet as pq
+                pq.write_table(results, tmp_path)
+                span["rows"] = results.num_rows
+            else:
+                df = _to_frame(results)
+                if df is None:
+                    logger.warning(f"Nothing to register as local table '{table}'.")
+                    return None
+                df.to_parquet(tmp_path, index=False)
+                span["rows"] = len(df)
+            os.replace(tmp_path, target)
+            span["bytes"] = os.path.getsize(target)
+        logger.info(f"Registered local table '{table}' ({span['rows']} rows): {target}")
+        return table
+
+    def _connect(self):
+        try:
+            import duckdb
+        except ImportError:
+            logger.error("Module 'duckdb' not found. Please install duckdb to query local tables.")
+            raise
+        conn = duckdb.connect()
+        for table, path in self.tables().items():
+            escaped = path.replace("'", "''")
+            conn.execute(f'CREATE VIEW "{table}" AS SELECT * FROM read_parquet(\'{escaped}\')')
+        return conn
+
+    def query(self, sql):
+        """Run SQL over the local tables and return the result as a DataFrame."""
+        conn = self._connect()
+        try:
+            with metrics.span("local_query") as span:
+                df = conn.execute(sql).df()
+                span["rows"], span["bytes"] = len(df), frame_nbytes(df)
+        finally:
+            conn.close()
+        return df
@@ -1,12 +1,111 @@
+import os
+import copy
+import json
+import queue
+import atexit
 import logging
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
 from rich.logging import RichHandler
 
+def _rich_handler(rich_tracebacks=True):
+    """Console handler; every Rich handler in the process is built here so the output looks the same."""
+    return RichHandler(rich_tracebacks=rich_tracebacks, show_path=True, log_time_format="[%X]")
+
 # Configure rich logger
 logging.basicConfig(
     level="INFO",
     format="%(message)s",
     datefmt="[%X]",
-    handlers=[RichHandler(rich_tracebacks=True, show_path=True)]
+    handlers=[_rich_handler()]
 )
 
 logger = logging.getLogger("fivecross")
+
+_listener = None
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, thread, task, source line, message, traceback."""
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "task": getattr(record, "task", None),
+            "where": f"{record.module}:{record.lineno}",
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class _TaskQueueHandler(QueueHandler):
+    """
+    Enqueues a copy of each record with its message and traceback already rendered to text and
+    the current metrics task attached; formatting for console and file happens on the listener.
+    """
+    def __init__(self, log_queue, current_task):
+        super().__init__(log_queue)
+        self._current_task = current_task
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.task = self._current_task()
+        return record
+
+def setup_queue_logging(name="run", console=True):
+    """
+    Route all logging through an unbounded queue: callers only enqueue, and one listener thread
+    writes JSON lines to LOG_DIR/<name>_<timestamp>_<pid>.jsonl and, with `console`, renders the
+    Rich console. Returns the log file path. Stopped (and flushed) at exit.
+    """
+    global _listener
+    from src.config import settings
+    from src.utils.metrics import metrics
+    if _listener is not None:
+        return _listener.path
+
+    os.makedirs(settings.LOG_DIR, exist_ok=True)
+    path = os.path.join(settings.LOG_DIR, f"{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{os.getpid()}.jsonl")
+    file_handler = logging.FileHandler(path, encoding="utf-8")
+    file_handler.setFormatter(JsonLinesFormatter())
+    handlers = [file_handler]
+    if console:
+        # Tracebacks arrive pre-rendered as text, so rich tracebacks are off here
+        handlers.append(_rich_handler(rich_tracebacks=False))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    queue_handler = _TaskQueueHandler(log_queue, metrics.current_task)
+    root.addHandler(queue_handler)
+
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.path = path
+    _listener.queue_handler = queue_handler
+    _listener.start()
+    atexit.register(stop_queue_logging)
+    logger.info(f"Logging to {path}")
+    return path
+
+def stop_queue_logging():
+    """Drain the queue, close the listener's handlers and log to the Rich console again."""
+    global _listener
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    root = logging.getLogger()
+    root.removeHandler(listener.queue_handler)
+    root.addHandler(_rich_handler())
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
@@ -1,11 +1,184 @@
 import smtplib
 import os
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
+import gzip
+import uuid
+import queue
+import base64
+import atexit
+import shutil
+import zipfile
+import tempfile
+import threading
+from email.header import Header
+from email.utils import formatdate, make_msgid
+from urllib.parse import quote
 from src.config import settings
 from src.utils.logger import logger
+from src.utils.metrics import metrics
+
+# 57 raw bytes encode to exactly one 76-char base64 line, so chunks stay line-aligned
+_CHUNK_SIZE = 57 * 1024 * 16
+_PRECOMPRESSED_EXTS = ('.zip', '.gz', '.zst', '.bz2', '.xz', '.7z', '.xlsx', '.parquet')
+
+def _credentials_configured():
+    if not settings.SENDER_EMAIL or not settings.SENDER_PASSWORD:
+        logger.error("Email credentials not configured in .env")
+        return False
+    return True
+
+def _open_smtp_session():
+    server = smtplib.SMTP_SSL(settings.SMTP_SERVER, settings.SMTP_PORT, timeout=settings.SMTP_TIMEOUT)
+    server.login(settings.SENDER_EMAIL, settings.SENDER_PASSWORD)
+    return server
+
+def _compress_attachment(filepath, workdir):
+    """
+    Compress one attachment into workdir by streaming it through zip/gzip in fixed-size chunks.
+    Files that are already compressed containers are passed through unchanged.
+    """
+    method = settings.MAIL_COMPRESSION
+    filename = os.path.basename(filepath)
+    if method not in ("zip", "gzip") or filename.lower().endswith(_PRECOMPRESSED_EXTS):
+        return filepath, filename, "application/octet-stream"
+
+    if method == "zip":
+        target = os.path.join(workdir, f"{filename}.zip")
+        with zipfile.ZipFile(target, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+            zf.write(filepath, arcname=filename)
+        ctype = "application/zip"
+    else:
+        target = os.path.join(workdir, f"{filename}.gz")
+        with open(filepath, 'rb') as src, gzip.open(target, 'wb') as dst:
+            shutil.copyfileobj(src, dst, _CHUNK_SIZE)
+        ctype = "application/gzip"
+
+    original, compressed = os.path.getsize(filepath), os.path.getsize(target)
+    if compressed >= original:
+        return filepath, filename, "application/octet-stream"
+    logger.info(f"Compressed attachment {filename}: {original:,} -> {compressed:,} bytes")
+    return target, os.path.basename(target), ctype
+
+def _encoded_size(filepath):
+    """Size of a file once base64-encoded into 76-char CRLF lines."""
+    raw = os.path.getsize(filepath)
+    encoded = 4 * ((raw + 2) // 3)
+    return encoded + 2 * (encoded // 76 + 1)
+
+def _split_batches(parts, max_bytes):
+    """Greedily group attachments so each message stays under max_bytes of encoded payload."""
+    batches, current, current_size = [], [], 0
+    for part in parts:
+        size = _encoded_size(part[0])
+        if size > max_bytes:
+            logger.warning(f"Attachment {part[1]} alone exceeds the {max_bytes:,} byte mail cap; sending it on its own.")
+        if current and current_size + size > max_bytes:
+            batches.append(current)
+            current, current_size = [], 0
+        current.append(part)
+        current_size += size
+    if current or not batches:
+        batches.append(current)
+    return batches
+
+def _encode_header(value):
+    return Header(value, 'utf-8').encode(linesep='\r\n') if not value.isascii() else value
+
+def _stream_base64(server, data_source):
+    """Send base64 in 76-char lines, reading _CHUNK_SIZE bytes at a time (a multiple of 57)."""
+    while True:
+        chunk = data_source.read(_CHUNK_SIZE)
+        if not chunk:
+            break
+        server.send(base64.encodebytes(chunk).replace(b"\n", b"\r\n"))
+
+def _stream_message(server, recipients, subject, body, parts):
+    """
+    Write one multipart message straight onto the SMTP DATA stream.
+    Memory stays bounded by _CHUNK_SIZE regardless of attachment size. All content is base64,
+    so no line ever starts with '.' and no dot-stuffing is needed.
+    """
+    server.ehlo_or_helo_if_needed()
+    code, resp = server.mail(settings.SENDER_EMAIL)
+    if code != 250:
+        server.rset()
+        raise smtplib.SMTPSenderRefused(code, resp, settings.SENDER_EMAIL)
+    refused = {}
+    for rcpt in recipients:
+        code, resp = server.rcpt(rcpt)
+        if code not in (250, 251):
+            refused[rcpt] = (code, resp)
+    if len(refused) == len(recipients):
+        server.rset()
+        raise smtplib.SMTPRecipientsRefused(refused)
+
+    server.putcmd("data")
+    code, resp = server.getreply()
+    if code != 354:
+        raise smtplib.SMTPDataError(code, resp)
+    try:
+        _stream_body(server, subject, body, parts, recipients)
+    except BaseException:
+        # The server is still in DATA state: any further command would be read as message
+        # text, so the connection cannot be reused
+        server.close()
+        raise
+    if refused:
+        logger.warning(f"Some recipients were refused: {list(refused)}")
+
+def _stream_body(server, subject, body, parts, recipients):
+    """Headers, body and base64 attachments of one message, ending with the DATA terminator."""
+    boundary = f"===============fcdc{uuid.uuid4().hex}=="
+    headers = [
+        f"From: {settings.SENDER_EMAIL}",
+        f"To: {', '.join(recipients)}",
+        f"Subject: {_encode_header(subject)}",
+        f"Date: {formatdate(localtime=True)}",
+        f"Message-ID: {make_msgid()}",
+        "MIME-Version: 1.0",
+        f'Content-Type: multipart/mixed; boundary="{boundary}"',
+        "",
+        f"--{boundary}",
+        'Content-Type: text/plain; charset="utf-8"',
+        "Content-Transfer-Encoding: base64",
+        "",
+    ]
+    server.send(("\r\n".join(headers) + "\r\n").encode('ascii'))
+    server.send(base64.encodebytes(body.encode('utf-8')).replace(b"\n", b"\r\n"))
+
+    for path, filename, ctype in parts:
+        part_headers = [
+            f"--{boundary}",
+            f"Content-Type: {ctype}",
+            "Content-Transfer-Encoding: base64",
+            f"Content-Disposition: attachment; filename*=utf-8''{quote(filename)}" if not filename.isascii()
+            else f'Content-Disposition: attachment; filename="{filename}"',
+            "",
+        ]
+        server.send(("\r\n".join(part_headers) + "\r\n").encode('ascii'))
+        with open(path, 'rb') as f:
+            _stream_base64(server, f)
+
+    server.send(f"--{boundary}--\r\n.\r\n".encode('ascii'))
+    code, resp = server.getreply()
+    if code != 250:
+        raise smtplib.SMTPDataError(code, resp)
+
+def _deliver(server, recipients, subject, body, attachments=None, sent=None):
+    """
+    Compress attachments, split them across messages if they exceed MAIL_MAX_BYTES,
+    and stream each message to the open SMTP session. `sent` collects the numbers of the
+    parts already delivered; a retry with the same set skips them.
+    """
+    sent = set() if sent is None else sent
+    with tempfile.TemporaryDirectory(prefix="fcdc_mail_") as workdir:
+        parts = [_compress_attachment(p, workdir) for p in (attachments or []) if os.path.exists(p)]
+        batches = _split_batches(parts, settings.MAIL_MAX_BYTES)
+        for idx, batch in enumerate(batches, 1):
+            if idx in sent:
+                continue
+            part_subject = subject if len(batches) == 1 else f"{subject} (part {idx}/{len(batches)})"
+            _stream_message(server, recipients, part_subject, body, batch)
+            sent.add(idx)
 
 def send_emails(recipients, subject, body, attachments=None):
     """
@@ -14,32 +187,158 @@ def send_emails(recipients, subject, body, attachments=None):
     if not recipients:
         return
 
-    if not settings.SENDER_EMAIL or not settings.SENDER_PASSWORD:
-        logger.error("Email credentials not configured in .env")
+    if not _credentials_configured():
         return
 
-    try:
-        msg = MIMEMultipart()
-        msg['From'] = settings.SENDER_EMAIL
-        msg['To'] = ", ".join(recipients)
-        msg['Subject'] = subject
-
-        msg.attach(MIMEText(body, 'plain'))
-
-        if attachments:
-            for filepath in attachments:
-                if os.path.exists(filepath):
-                    part = MIMEBase('application', "octet-stream")
-                    with open(filepath, 'rb') as file:
-                        part.set_payload(file.read())
-                    encoders.encode_base64(part)
-                    part.add_header('Content-Disposition', f'attachment; filename="{os.path.basename(filepath)}"')
-                    msg.attach(part)
-
-        server = smtplib.SMTP_SSL(settings.SMTP_SERVER, settings.SMTP_PORT)
-        server.login(settings.SENDER_EMAIL, settings.SENDER_PASSWORD)
-        server.send_message(msg)
-        server.quit()
-        logger.info(f"Email sent successfully to: {recipients}")
-    except Exception as e:
-        logger.error(f"Failed to send email: {e}")
+    with metrics.span("email", recipients=len(recipients)) as span:
+        try:
+            server = _open_smtp_session()
+            try:
+                _deliver(server, recipients, subject, body, attachments)
+            except Exception:
+                # The session may be mid-DATA: close the socket instead of a polite QUIT
+                server.close()
+                raise
+            server.quit()
+            logger.info(f"Email sent successfully to: {recipients}")
+        except Exception as e:
+            span["status"] = "error"
+            logger.error(f"Failed to send email: {e}")
+
+class MailDispatcher:
+    """
+    Background email dispatcher for batch runs.
+    Reuses one authenticated SMTP session (reconnecting if the server drops it)
+    and sends from a worker thread so fetching is never blocked on the mail server.
+    With coalesce=True, reports for the same recipients are merged into one message on flush.
+    """
+    _STOP = object()
+
+    def __init__(self, coalesce=False):
+        self.coalesce = coalesce
+        self.sent = 0
+        self.failed = 0
+        self._queue = queue.Queue()
+        self._pending = {}
+        self._server = None
+        self._closed = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._worker, name="mail-dispatcher", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, recipients, subject, body, attachments=None):
+        """Queue a report for delivery. Returns immediately."""
+        recipients = [r.strip() for r in recipients if r and "@" in r]
+        if not recipients:
+            return
+        job = {"recipients": recipients, "subject": subject, "body": body, "attachments": list(attachments or [])}
+        with self._lock:
+            if self._closed:
+                logger.warning(f"Mail dispatcher already closed, sending synchronously: {subject}")
+                send_emails(**job)
+                return
+            if self.coalesce:
+                key = tuple(sorted({r.lower() for r in recipients}))
+                self._pending.setdefault(key, []).append((metrics.current_task(), job))
+                return
+        # The worker thread does not inherit the task context, so carry the task name along
+        self._queue.put((metrics.current_task(), job))
+
+    def flush(self):
+        """Hand over coalesced reports to the worker and wait until everything queued is sent."""
+        with self._lock:
+            groups, self._pending = self._pending, {}
+        for items in groups.values():
+            tasks = {task for task, _ in items}
+            self._queue.put((tasks.pop() if len(tasks) == 1 else None, self._merge([job for _, job in items])))
+        self._queue.join()
+
+    def close(self):
+        """Flush outstanding mail, stop the worker and report the outcome. Safe to call twice."""
+        with self._lock:
+            if self._closed:
+                return
+        self.flush()
+        with self._lock:
+            self._closed = True
+        self._queue.put(self._STOP)
+        self._thread.join()
+        if self.sent or self.failed:
+            logger.info(f"[*] Mail dispatcher finished: {self.sent} sent, {self.failed} failed.")
+
+    @staticmethod
+    def _merge(jobs):
+        if len(jobs) == 1:
+            return jobs[0]
+        attachments = []
+        for job in jobs:
+            attachments.extend(a for a in job["attachments"] if a not in attachments)
+        return {
+            "recipients": jobs[0]["recipients"],
+            "subject": f"Data Report: {len(jobs)} tasks",
+            "body": "\n\n".join(f"{job['subject']}\n{job['body']}" for job in jobs),
+            "attachments": attachments,
+        }
+
+    def _drop_session(self):
+        if self._server is not None:
+            try:
+                self._server.close()
+            except Exception:
+                pass
+            self._server = None
+
+    def _ensure_session(self):
+        if self._server is not None:
+            try:
+                if self._server.noop()[0] == 250:
+                    return self._server
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
+        self._server = _open_smtp_session()
+        return self._server
+
+    def _send(self, task, job):
+        if not _credentials_configured():
+            self.failed += 1
+            return
+        # Parts of a split report already delivered; a reconnect resumes after them
+        sent = set()
+        with metrics.span("email", task=task, recipients=len(job["recipients"])) as span:
+            for attempt in range(2):
+                try:
+                    _deliver(self._ensure_session(), sent=sent, **job)
+                    self.sent += 1
+                    logger.info(f"Email sent successfully to: {job['recipients']}")
+                    return
+                except (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError) as e:
+                    self._drop_session()
+                    if attempt == 0:
+                        logger.warning(f"SMTP session dropped ({e}), reconnecting...")
+                        continue
+                    logger.error(f"Failed to send email: {e}")
+                except Exception as e:
+                    # The session may have been left mid-message; never reuse it
+                    self._drop_session()
+                    logger.error(f"Failed to send email: {e}")
+                    break
+            span["status"] = "error"
+            self.failed += 1
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is self._STOP:
+                    break
+                self._send(*item)
+            finally:
+                self._queue.task_done()
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
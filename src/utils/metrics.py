@@ -0,0 +1,178 @@
+import os
+import sys
+import json
+import time
+import atexit
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime
+from src.config import settings
+from src.utils.logger import logger
+
+_current_task = contextvars.ContextVar("fcdc_metrics_task", default=None)
+
+def peak_rss_bytes():
+    """Peak resident set size of this process so far, or None if the platform cannot tell."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports KiB, macOS reports bytes
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        mem = psutil.Process().memory_info()
+        # Windows exposes the peak working set; elsewhere fall back to current RSS
+        return getattr(mem, "peak_wset", None) or mem.rss
+    except ImportError:
+        return None
+
+def current_rss_bytes():
+    """Current resident set size of this process (unlike the peak, it goes down when memory is freed), or None."""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def child_rss_bytes():
+    """Current RSS of all child processes (e.g. the Playwright driver and Chromium), or None without psutil."""
+    try:
+        import psutil
+    except ImportError:
+        return None
+    total = 0
+    for child in psutil.Process().children(recursive=True):
+        try:
+            total += child.memory_info().rss
+        except psutil.Error:
+            pass
+    return total
+
+def frame_nbytes(data):
+    """Best-effort in-memory size of a fetched result."""
+    try:
+        if hasattr(data, "memory_usage"):
+            return int(data.memory_usage(index=False, deep=False).sum())
+        if hasattr(data, "nbytes"):
+            return int(data.nbytes)
+    except Exception:
+        pass
+    return None
+
+class MetricsRecorder:
+    """
+    Records structured timing spans (wall time, rows, bytes, process RSS at the end and its change
+    over the span) for each stage of a run. Every span is appended to a per-run JSON-lines file
+    under METRICS_DIR as soon as it closes; if METRICS_PROM_FILE is set, a Prometheus textfile with
+    the latest values is written after each batch or daemon run, and at exit.
+    """
+    def __init__(self):
+        self.enabled = settings.METRICS_ENABLED
+        self.run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.path = os.path.join(settings.METRICS_DIR, f"run_{self.run_id}_{os.getpid()}.jsonl")
+        self._lock = threading.Lock()
+        self._latest = {}
+        atexit.register(self.write_prometheus)
+
+    def current_task(self):
+        return _current_task.get()
+
+    @contextmanager
+    def task(self, name):
+        """Attribute all spans opened inside this block (including in engines) to a task."""
+        token = _current_task.set(name)
+        try:
+            yield
+        finally:
+            _current_task.reset(token)
+
+    @contextmanager
+    def span(self, stage, **attrs):
+        """
+        Time one stage. The yielded dict can be updated with rows/bytes (or any extra field)
+        before the block ends.
+        """
+        record = {"task": _current_task.get(), "stage": stage, "rows": None, "bytes": None}
+        record.update(attrs)
+        rss_start = current_rss_bytes()
+        start = time.perf_counter()
+        record["status"] = "ok"
+        try:
+            yield record
+        except BaseException:
+            record["status"] = "error"
+            raise
+        finally:
+            record["wall_s"] = round(time.perf_counter() - start, 4)
+            # Current RSS, not ru_maxrss: the lifetime peak would repeat the first big span forever
+            record["rss"] = current_rss_bytes()
+            record["rss_delta"] = record["rss"] - rss_start if record["rss"] is not None and rss_start is not None else None
+            self._emit(record)
+
+    def record(self, stage, wall_s, **attrs):
+        """Emit a span measured elsewhere, e.g. an ODPS instance's run time observed by a status poller."""
+        record = {"task": _current_task.get(), "stage": stage, "rows": None, "bytes": None, "status": "ok"}
+        record.update(attrs)
+        record["wall_s"] = round(wall_s, 4)
+        record["rss"], record["rss_delta"] = current_rss_bytes(), None
+        self._emit(record)
+
+    def _emit(self, record):
+        if not self.enabled:
+            return
+        record = {"run_id": self.run_id, "ts": datetime.now().isoformat(timespec="seconds"), **record}
+        try:
+            with self._lock:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                key = (record.get("task") or "", record["stage"], record.get("format") or "")
+                self._latest[key] = record
+        except Exception as e:
+            logger.warning(f"Failed to write metrics span: {e}")
+
+    def write_prometheus(self, path=None):
+        """Write the latest value of every (task, stage) as Prometheus gauges (textfile collector format)."""
+        path = path or settings.METRICS_PROM_FILE
+        if not self.enabled or not path or not self._latest:
+            return
+        metrics = [
+            ("fcdc_stage_wall_seconds", "wall_s", "Wall time of the stage in seconds"),
+            ("fcdc_stage_rows", "rows", "Rows handled by the stage"),
+            ("fcdc_stage_bytes", "bytes", "Bytes handled by the stage"),
+            ("fcdc_stage_rss_bytes", "rss", "Process RSS at the end of the stage"),
+            ("fcdc_stage_rss_delta_bytes", "rss_delta", "Change in process RSS over the stage"),
+        ]
+        lines = []
+        with self._lock:
+            records = list(self._latest.values())
+        for name, field, help_text in metrics:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for r in records:
+                if r.get(field) is None:
+                    continue
+                labels = {"task": r.get("task") or "", "stage": r["stage"], "format": r.get("format") or "", "status": r["status"]}
+                label_str = ",".join(f'{k}="{_escape_label(v)}"' for k, v in labels.items())
+                lines.append(f"{name}{{{label_str}}} {r[field]}")
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"Failed to write Prometheus metrics file: {e}")
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+metrics = MetricsRecorder()
@@ -0,0 +1,171 @@
+import os
+import json
+import shutil
+from string import Template
+from datetime import datetime, timedelta
+import pandas as pd
+from src.config import settings
+from src.utils.logger import logger
+from src.utils.metrics import metrics, frame_nbytes
+from src.utils.exporter import is_arrow_table
+
+class PartitionStore:
+    """
+    Local partitioned Parquet store for an incremental task. Each partition value of the task's
+    date key lives in its own file under STORE_DIR/<task>/<key>=<value>/part.parquet, and a
+    watermark file records the last date window that was fetched successfully.
+
+    Task config:
+      "incremental": {"key": "day", "start": "20250101", "format": "%Y%m%d", "lookback": 2}
+
+    The task SQL filters on ${start} and ${end}, which are filled with the window to fetch:
+    everything after the watermark (minus `lookback` days re-pulled for late data) up to `end`
+    (default yesterday). Exports are always assembled from the full local store.
+    """
+    WATERMARK_FILE = "_watermark.json"
+
+    def __init__(self, name, key, start, date_format="%Y%m%d", lookback=0, end=None, root=None):
+        self.name = name
+        self.key = key
+        self.start = start
+        self.date_format = date_format
+        self.lookback = int(lookback or 0)
+        self.end = end
+        self.path = os.path.join(root or settings.STORE_DIR, name)
+        self._pending = None
+
+    @classmethod
+    def from_task(cls, task_config):
+        """Build the store for a task with an "incremental" block, or return None."""
+        inc = task_config.get("incremental")
+        if not inc:
+            return None
+        if not inc.get("key") or not inc.get("start"):
+            raise ValueError("incremental tasks need both 'key' and 'start'")
+        name = task_config.get("name", f"{task_config.get('engine', 'ta')}_export")
+        return cls(name, inc["key"], str(inc["start"]), inc.get("format", "%Y%m%d"),
+                   inc.get("lookback", 0), inc.get("end"))
+
+    def _parse(self, value):
+        return datetime.strptime(str(value), self.date_format)
+
+    def _format(self, value):
+        return value.strftime(self.date_format)
+
+    def _partition_dir(self, value):
+        return os.path.join(self.path, f"{self.key}={value}")
+
+    def partitions(self):
+        """Stored partition values, oldest first."""
+        if not os.path.isdir(self.path):
+            return []
+        prefix = f"{self.key}="
+        values = [d[len(prefix):] for d in os.listdir(self.path) if d.startswith(prefix)]
+        return sorted(values, key=self._parse)
+
+    def watermark(self):
+        path = os.path.join(self.path, self.WATERMARK_FILE)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get("watermark")
+
+    def _set_watermark(self, value):
+        os.makedirs(self.path, exist_ok=True)
+        path = os.path.join(self.path, self.WATERMARK_FILE)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump({"watermark": value, "updated": datetime.now().isoformat(timespec="seconds")}, f)
+        os.replace(f"{path}.tmp", path)
+
+    def window(self):
+        """(start, end) dates still to fetch, or None when the store is up to date."""
+        end = self._parse(self.end) if self.end else datetime.now() - timedelta(days=1)
+        watermark = self.watermark()
+        if watermark is None:
+            start = self._parse(self.start)
+        else:
+            start = self._parse(watermark) + timedelta(days=1 - self.lookback)
+            start = max(start, self._parse(self.start))
+        if start.date() > end.date():
+            return None
+        return self._format(start), self._format(end)
+
+    def render(self, sql):
+        """Fill ${start}/${end} with the pending window. Returns None if there is nothing to fetch."""
+        window = self.window()
+        if window is None:
+            logger.info(f"Store for {self.name} is up to date (watermark {self.watermark()}), skipping query.")
+            return None
+        logger.info(f"Incremental fetch for {self.name}: {self.key} {window[0]} .. {window[1]}")
+        self._pending = window
+        return Template(sql).safe_substitute(start=window[0], end=window[1])
+
+    def merge(self, results):
+        """
+        Replace the stored partitions of the fetched window with `results`, advance the watermark
+        to the newest partition actually received and return the full history as one DataFrame.
+        With results=None only the store is read; an empty result leaves store and watermark as they are,
+        so days whose upstream partition has not landed yet are fetched again next run.
+        """
+        window = self._pending
+        if results is not None and window is not None:
+            if is_arrow_table(results):
+                results = results.to_pandas()
+            if not isinstance(results, pd.DataFrame):
+                raise ValueError("incremental tasks need a tabular result (DataFrame or Arrow table)")
+            if self.key not in results.columns:
+                raise ValueError(f"incremental key column '{self.key}' missing from the result")
+            if results.empty:
+                logger.warning(f"Incremental fetch for {self.name} returned no rows for {window[0]} .. {window[1]}; "
+                               f"watermark stays at {self.watermark()}.")
+            else:
+                with metrics.span("store", task_store=self.name) as span:
+                    fetched = self._write_window(results, window)
+                    span["rows"] = len(results)
+                newest = max(fetched, key=self._parse)
+                current = self.watermark()
+                if current is None or self._parse(newest) > self._parse(current):
+                    self._set_watermark(newest)
+                if newest != window[1]:
+                    logger.warning(f"No data for {self.name} after {newest} (window ends {window[1]}); "
+                                   f"those days are fetched again next run.")
+            self._pending = None
+        return self.read()
+
+    def _partition_values(self, col):
+        """Key column as partition values in the store's date format."""
+        if pd.api.types.is_datetime64_any_dtype(col):
+            return col.dt.strftime(self.date_format)
+        values = col.astype(str)
+        if pd.to_datetime(values, format=self.date_format, errors="coerce").notna().all():
+            return values
+        # DATE columns (datetime.date objects) or strings in another layout, e.g. 2025-01-31
+        return pd.to_datetime(col).dt.strftime(self.date_format)
+
+    def _write_window(self, df, window):
+        """Write the fetched window's partitions and return the partition values received."""
+        values = self._partition_values(df[self.key])
+
+        # The re-pulled window is authoritative: drop stored partitions it no longer returns
+        start, end = self._parse(window[0]), self._parse(window[1])
+        fetched = set(values.unique())
+        for value in self.partitions():
+            if start <= self._parse(value) <= end and value not in fetched:
+                shutil.rmtree(self._partition_dir(value), ignore_errors=True)
+
+        for value, part in df.groupby(values, sort=True):
+            part_dir = self._partition_dir(value)
+            os.makedirs(part_dir, exist_ok=True)
+            target = os.path.join(part_dir, "part.parquet")
+            part.to_parquet(f"{target}.tmp", index=False)
+            os.replace(f"{target}.tmp", target)
+        logger.info(f"Stored {len(df)} rows in {len(fetched)} partitions for {self.name}")
+        return fetched
+
+    def read(self):
+        """Assemble the whole store, oldest partition first."""
+        with metrics.span("store_read", task_store=self.name) as span:
+            frames = [pd.read_parquet(os.path.join(self._partition_dir(v), "part.parquet")) for v in self.partitions()]
+            df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+            span["rows"], span["bytes"] = len(df), frame_nbytes(df)
+        return df
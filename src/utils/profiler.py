@@ -0,0 +1,131 @@
+import os
+import re
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from src.config import settings
+from src.utils.logger import logger
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class _StackSampler:
+    """
+    Samples the stacks of all threads every `interval` seconds into flamegraph.pl / speedscope
+    collapsed-stack counts, so time spent in engine worker threads shows up too.
+    """
+    def __init__(self, interval):
+        self.interval = interval
+        self.counts = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                if ident not in names:
+                    names = {t.ident: t.name for t in threading.enumerate()}
+                stack.append(names.get(ident, f"thread-{ident}"))
+                self.counts[";".join(reversed(stack))] += 1
+
+class Profiler:
+    """
+    `--profile` support: each profiled block (a task, a batch, a prediction) runs under cProfile,
+    a stack sampler and tracemalloc, and leaves <name>_<timestamp>.pstats, .collapsed and
+    _memory.txt in PROFILE_DIR. Blocks nested in a profiled block are part of the outer profile.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.summaries = []
+        self._active = False
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def profile(self, name):
+        with self._lock:
+            start = self.enabled and not self._active
+            if start:
+                self._active = True
+        if not start:
+            yield
+            return
+
+        started_tracemalloc = not tracemalloc.is_tracing()
+        if started_tracemalloc:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        sampler = _StackSampler(settings.PROFILE_SAMPLE_INTERVAL)
+        prof = cProfile.Profile()
+        t0 = time.perf_counter()
+        sampler.start()
+        prof.enable()
+        try:
+            yield
+        finally:
+            prof.disable()
+            sampler.stop()
+            wall = time.perf_counter() - t0
+            peak = tracemalloc.get_traced_memory()[1]
+            snapshot = tracemalloc.take_snapshot()
+            if started_tracemalloc:
+                tracemalloc.stop()
+            try:
+                self._write(name, prof, sampler.counts, snapshot, peak, wall)
+            except Exception as e:
+                logger.warning(f"Failed to write profile for {name}: {e}")
+            with self._lock:
+                self._active = False
+
+    def _write(self, name, prof, stacks, snapshot, peak, wall):
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        safe_name = re.sub(r"[^0-9A-Za-z_.-]+", "_", name)
+        base = os.path.join(settings.PROFILE_DIR, f"{safe_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+
+        prof.dump_stats(f"{base}.pstats")
+        with open(f"{base}.collapsed", "w", encoding="utf-8") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        with open(f"{base}_memory.txt", "w", encoding="utf-8") as f:
+            f.write(f"Peak traced memory: {peak / 2**20:.1f} MB\n")
+            f.write(f"Top {settings.PROFILE_MEMORY_TOP_N} allocation sites still held at the end:\n")
+            for stat in snapshot.statistics("lineno")[:settings.PROFILE_MEMORY_TOP_N]:
+                f.write(f"{stat}\n")
+
+        # Hot functions by own time, excluding the profiler's own frames
+        stats = pstats.Stats(prof)
+        hot = sorted(((tt, nc, func) for func, (cc, nc, tt, ct, callers) in stats.stats.items()
+                      if func[0] != __file__), reverse=True)[:5]
+        self.summaries.append({"name": name, "wall_s": wall, "peak": peak, "hot": hot, "path": base})
+        logger.info(f"Profile for {name} written to {base}.pstats/.collapsed/_memory.txt")
+
+    def print_summary(self):
+        """Short hot-function summary of every profile taken in this run."""
+        for s in self.summaries:
+            logger.info(f"[*] Profile {s['name']}: {s['wall_s']:.2f}s wall, peak traced memory {s['peak'] / 2**20:.1f} MB")
+            for tt, calls, (filename, line, func) in s["hot"]:
+                where = f"{os.path.basename(filename)}:{line}" if line else filename
+                logger.info(f"      {tt:8.3f}s  {calls:>9,} calls  {func} ({where})")
+
+profiler = Profiler()
@@ -0,0 +1,39 @@
+# Errors worth retrying, matched by class name (on the error or a base class) so optional drivers
+# need not be imported: connection drops, timeouts, server-side failures and overload.
+# Everything else (bad SQL arriving as a generic ODPSError, programming bugs) fails at once.
+TRANSIENT_ERRORS = {
+    # Python builtins (ConnectionResetError/BrokenPipeError derive from ConnectionError;
+    # socket.timeout and asyncio/concurrent TimeoutError are TimeoutError)
+    "ConnectionError", "TimeoutError",
+    # requests / urllib3
+    "Timeout", "ConnectTimeout", "ReadTimeout", "ReadTimeoutError", "ProtocolError", "ChunkedEncodingError",
+    # pyodps server-side and throttling errors
+    "InternalServerError", "ServiceUnavailable", "BadGatewayError", "RequestsConnectTimeout",
+    "QPSExceeded", "FlowExceeded", "SlotExceeded", "RequestQuotaExceeded", "WaitTimeoutError",
+    # psycopg2 / asyncpg connection failures
+    "OperationalError", "InterfaceError", "PostgresConnectionError", "ConnectionDoesNotExistError",
+    "CannotConnectNowError", "TooManyConnectionsError",
+    # smtplib
+    "SMTPServerDisconnected", "SMTPConnectError",
+    # Playwright (its TimeoutError is matched above; a crashed browser closes the target)
+    "TargetClosedError",
+}
+
+def _http_status(exc):
+    status = getattr(exc, "status_code", None) or getattr(getattr(exc, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+def is_transient(exc):
+    """
+    True only for errors known to be temporary: connection, timeout and server-side (HTTP 5xx)
+    errors. Anything else, including ODPS SQL errors and Python bugs, is not retried.
+    """
+    for cls in type(exc).__mro__:
+        if cls.__name__ in TRANSIENT_ERRORS:
+            return True
+    status = _http_status(exc)
+    return status is not None and status >= 500
+
+def backoff_delay(attempt, base):
+    """Exponential backoff: base, 2*base, 4*base, ... for attempt 0, 1, 2, ..."""
+    return base * 2 ** attempt
@@ -9,16 +9,17 @@ from rich.panel import Panel
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from src.utils.analyzer import LogAnalyzer
+from src.utils.compressed_io import CSV_EXTENSIONS
 from src.utils.logger import logger
 
 console = Console()
 
 def find_latest_csv(base_dir):
-    """Finds the most recently modified CSV in output or subdirs."""
+    """Finds the most recently modified CSV (plain, .csv.gz, .csv.zst or .zst) in output or subdirs."""
     csv_files = []
     for root, _, files in os.walk(base_dir):
         for f in files:
-            if f.lower().endswith('.csv'):
+            if f.lower().endswith(CSV_EXTENSIONS):
                 path = os.path.join(root, f)
                 csv_files.append((path, os.path.getmtime(path)))
     
@@ -30,7 +31,7 @@ def find_latest_csv(base_dir):
 def main():
     parser = argparse.ArgumentParser(description="FiveCross Log Seeker - Locate IDs in massive CSV logs.")
     parser.add_argument("ids", nargs="*", help="IDs to search for (space separated)")
-    parser.add_argument("--path", help="Path to specific CSV file. If omitted, finds latest in output/")
+    parser.add_argument("--path", help="Path to specific CSV file (.csv, .csv.gz, .csv.zst or .zst). If omitted, finds latest in output/")
     
     args = parser.parse_args()
     